@@ -0,0 +1,109 @@
+import os
+import random
+import time
+from collections import deque
+
+
+class AdaptivePoller:
+    """
+    Picks the interval until the next poll instead of polling once a minute around the clock.
+    It polls at the floor interval around the startDate of upcoming editions and when stock moves quickly,
+    stays at the default interval during the wednesday early access window
+    and backs off towards the ceiling while nothing changes.
+    The clock and the random source can be replaced to simulate whole days
+    """
+
+    def __init__(self, floor=15.0, ceiling=300.0, default=60.0, jitter=0.1,
+                 drop_lead=300.0, drop_follow=1800.0, velocity_window=900.0, fast_rate=2.0,
+                 backoff=1.5, clock=time.time, rng=None):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.default = default
+        self.jitter = jitter
+        # poll at the floor from drop_lead seconds before until drop_follow seconds after a startDate
+        self.drop_lead = drop_lead
+        self.drop_follow = drop_follow
+        self.velocity_window = velocity_window
+        # stock changes per minute above which the floor interval is used
+        self.fast_rate = fast_rate
+        self.backoff = backoff
+        self.clock = clock
+        self.rng = rng if rng is not None else random.Random()
+        self.start_dates = []
+        self.early_access = False
+        self.changes = deque()
+        self.quiet_interval = default
+        self.started = None
+        self.polls = 0
+
+    def observe(self, changes, start_dates=None, early_access=False, now=None):
+        """
+        records one finished poll, changes is the number of stock changes it found,
+        start_dates the epoch timestamps of the startDate of all upcoming editions.
+        An edition is no longer upcoming once it dropped, its startDate is kept until drop_follow seconds after it
+        """
+        now = self.clock() if now is None else now
+        if self.started is None:
+            self.started = now
+        self.polls += 1
+        if start_dates is not None:
+            dropped = [start_date for start_date in self.start_dates
+                       if now - self.drop_follow <= start_date <= now + self.drop_lead]
+            self.start_dates = sorted(set(start_dates) | set(dropped))
+        self.early_access = early_access
+        if changes:
+            self.changes.append((now, changes))
+            self.quiet_interval = self.default
+        else:
+            self.quiet_interval = min(self.quiet_interval * self.backoff, self.ceiling)
+        while self.changes and self.changes[0][0] < now - self.velocity_window:
+            self.changes.popleft()
+
+    def rate(self) -> float:
+        # stock changes per minute within the velocity window
+        return sum(changes for _, changes in self.changes) / (self.velocity_window / 60.0)
+
+    def next_interval(self, now=None) -> float:
+        now = self.clock() if now is None else now
+        interval = self.quiet_interval
+        rate = self.rate()
+        if rate >= self.fast_rate:
+            interval = self.floor
+        elif rate > 0:
+            interval = min(interval, self.default / (1.0 + rate))
+        if self.early_access:
+            interval = min(interval, self.default)
+        for start_date in self.start_dates:
+            if start_date - self.drop_lead <= now <= start_date + self.drop_follow:
+                interval = self.floor
+            elif now < start_date - self.drop_lead:
+                # wake up in time for the next drop
+                interval = min(interval, start_date - self.drop_lead - now)
+                break
+        interval *= 1.0 + self.rng.uniform(-self.jitter, self.jitter)
+        return min(max(interval, self.floor), self.ceiling)
+
+    @property
+    def stats(self) -> dict:
+        # polls a fixed schedule at the default interval would have made in the same time
+        elapsed = (self.clock() - self.started) if self.started is not None else 0.0
+        fixed_polls = int(elapsed // self.default) + (1 if self.started is not None else 0)
+        return {"polls": self.polls, "fixed_polls": fixed_polls, "saved": fixed_polls - self.polls}
+
+
+def configure(poller, floor=None, ceiling=None, default=None):
+    """
+    sets the intervals of a poller in seconds, the arguments default to the environment variables
+    DISPLATE_POLL_FLOOR, DISPLATE_POLL_CEILING and DISPLATE_POLL_DEFAULT
+    """
+    floor = float(floor or os.environ.get("DISPLATE_POLL_FLOOR", None) or poller.floor)
+    ceiling = float(ceiling or os.environ.get("DISPLATE_POLL_CEILING", None) or poller.ceiling)
+    default = float(default or os.environ.get("DISPLATE_POLL_DEFAULT", None) or poller.default)
+    if not 0 < floor <= default <= ceiling:
+        print(f"Ignoring the poll intervals {floor=}, {default=}, {ceiling=}, they must satisfy "
+              f"0 < floor <= default <= ceiling")
+        return
+    poller.floor = floor
+    poller.ceiling = ceiling
+    poller.default = default
+    poller.quiet_interval = min(max(poller.quiet_interval, floor), ceiling)
@@ -0,0 +1,161 @@
+import asyncio
+import random
+
+import aiohttp
+import disnake
+
+from metrics import default_metrics as metrics
+
+# discord rejects messages with more characters
+MESSAGE_LIMIT = 2000
+
+
+def split_message(text, limit=MESSAGE_LIMIT) -> list:
+    """
+    splits a message into chunks of at most limit characters, preferably at line breaks
+    """
+    chunks = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current != "":
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current.strip() != "":
+        chunks.append(current)
+    return chunks
+
+
+class Delivery:
+    __slots__ = ("kind", "content", "embed", "file_factory", "attempts")
+
+    def __init__(self, kind, content=None, embed=None, file_factory=None):
+        self.kind = kind
+        self.content = content
+        self.embed = embed
+        # a disnake.File can only be sent once, every attempt creates a new one
+        self.file_factory = file_factory
+        self.attempts = 0
+
+
+class AlertDelivery:
+    """
+    Sends alerts, stock updates and reveals to every channel of the configured environments of config["channels"],
+    e.g. {"prod": {"alert": id or [ids], ...}, "test": {...}}. Channels are resolved once and cached.
+    Every channel has its own queue, so messages to one channel keep their order and never race each other
+    on its rate limit route, while different channels are served concurrently. Failed sends are retried
+    with exponential backoff in the background, send() only enqueues and never delays the tracking cycle
+    """
+
+    def __init__(self, bot, channels: dict, environments=("test",), max_concurrent=5, max_attempts=5,
+                 retry_delay=2.0):
+        self.bot = bot
+        self.channels = channels
+        self.environments = list(environments)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.resolved = {}
+        self.queues = {}
+        self.workers = {}
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+
+    def channel_ids(self, kind) -> list:
+        ids = []
+        for environment in self.environments:
+            configured = self.channels.get(environment, {}).get(kind, None)
+            if configured is None:
+                continue
+            for channel_id in configured if isinstance(configured, list) else [configured]:
+                if channel_id not in ids:
+                    ids.append(channel_id)
+        return ids
+
+    async def get_channel(self, channel_id):
+        channel = self.resolved.get(channel_id, None)
+        if channel is None:
+            # the gateway cache first, a REST request only if the channel is not cached
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                with metrics.span("fetch_channel"):
+                    channel = await self.bot.fetch_channel(channel_id)
+            self.resolved[channel_id] = channel
+        return channel
+
+    def send(self, kind, content=None, embed=None, file_factory=None) -> int:
+        """
+        queues a message for every channel of the kind, long texts are split. Returns the number of queued sends
+        """
+        contents = split_message(content) if content is not None else [None]
+        queued = 0
+        for channel_id in self.channel_ids(kind):
+            for index, chunk in enumerate(contents):
+                # embed and file go with the last chunk
+                last = index == len(contents) - 1
+                self._queue(channel_id).put_nowait(Delivery(kind, chunk, embed if last else None,
+                                                            file_factory if last else None))
+                queued += 1
+        return queued
+
+    def _queue(self, channel_id) -> asyncio.Queue:
+        queue = self.queues.get(channel_id, None)
+        if queue is None:
+            queue = self.queues[channel_id] = asyncio.Queue()
+        worker = self.workers.get(channel_id, None)
+        if worker is None or worker.done():
+            self.workers[channel_id] = asyncio.get_running_loop().create_task(self._work(channel_id, queue))
+        return queue
+
+    async def _work(self, channel_id, queue):
+        while True:
+            delivery = await queue.get()
+            try:
+                await self._deliver(channel_id, delivery)
+            except Exception as error:
+                # e.g. a failing file_factory, the worker keeps sending the rest of the queue
+                metrics.incr("send_failures_total", kind=delivery.kind, error=type(error).__name__)
+                print(f"Unable to send {delivery.kind} to channel {channel_id}: {type(error).__name__}: {error}")
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, channel_id, delivery):
+        while True:
+            delivery.attempts += 1
+            try:
+                async with self._semaphore:
+                    channel = await self.get_channel(channel_id)
+                    kwargs = {}
+                    if delivery.content is not None:
+                        kwargs["content"] = delivery.content
+                    if delivery.embed is not None:
+                        kwargs["embed"] = delivery.embed
+                    if delivery.file_factory is not None:
+                        kwargs["file"] = delivery.file_factory()
+                    with metrics.span(f"send_{delivery.kind}"):
+                        await channel.send(**kwargs)
+                metrics.incr("messages_sent_total", kind=delivery.kind)
+                return
+            except (disnake.Forbidden, disnake.NotFound) as error:
+                # retrying does not help, the channel is resolved again for the next message
+                self.resolved.pop(channel_id, None)
+                metrics.incr("send_failures_total", kind=delivery.kind, error=type(error).__name__)
+                print(f"Unable to send {delivery.kind} to channel {channel_id}: {error}")
+                return
+            except (disnake.HTTPException, aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+                if delivery.attempts >= self.max_attempts:
+                    metrics.incr("send_failures_total", kind=delivery.kind, error=type(error).__name__)
+                    print(f"Giving up sending {delivery.kind} to channel {channel_id} "
+                          f"after {delivery.attempts} attempts: {error}")
+                    return
+                metrics.incr("send_retries_total", kind=delivery.kind)
+                delay = self.retry_delay * 2 ** (delivery.attempts - 1)
+                await asyncio.sleep(delay * random.uniform(1.0, 1.5))
+
+    async def join(self):
+        # waits until every queued message was sent or dropped
+        await asyncio.gather(*[queue.join() for queue in self.queues.values()])
@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from storage import default_storage
+
+GENERAL_ALERTS_FILE = "general_alerts.json"
+
+
+class AlertState:
+    """
+    Keeps the alert flags of every title (data/{title}/alerts.json) and the general alert config
+    (data/general_alerts.json) in memory. Every file is read once, checks are answered from memory,
+    changes are marked dirty and written atomically in one batch by flush().
+    Files edited by hand are reloaded, their modification time is checked at most every reload_interval seconds
+    """
+
+    def __init__(self, data_dir=None, reload_interval=60.0):
+        self.data_dir = Path(data_dir) if data_dir is not None else None
+        self.reload_interval = reload_interval
+        self.files = {}
+        self.mtimes = {}
+        self.dirty = set()
+        self.last_refresh = time.monotonic()
+        # increased whenever the general config was (re)loaded, lets callers cache derived data
+        self.general_version = 0
+        self.stats = {"reads": 0, "writes": 0, "reloads": 0}
+        # the tracking cycle runs in a worker thread of the bot, the regular update on the event loop
+        self._lock = threading.RLock()
+
+    def set_data_dir(self, data_dir):
+        data_dir = Path(data_dir)
+        with self._lock:
+            if data_dir != self.data_dir:
+                if self.data_dir is not None:
+                    self.flush()
+                self.data_dir = data_dir
+                self.files = {}
+                self.mtimes = {}
+
+    def _path(self, title) -> Path:
+        if title is None:
+            return self.data_dir / GENERAL_ALERTS_FILE
+        return self.data_dir / f"{title}/alerts.json"
+
+    def _read(self, key):
+        filepath = self._path(key)
+        self.stats["reads"] += 1
+        try:
+            self.mtimes[key] = os.stat(filepath).st_mtime_ns
+            with open(filepath) as json_file:
+                data = json.load(json_file)
+        except FileNotFoundError:
+            data = {}
+        except Exception as err:
+            print(f"Error in AlertState while reading {filepath}:", err)
+            data = {}
+        if key is None:
+            self.general_version += 1
+        return data
+
+    def _get(self, key) -> dict:
+        with self._lock:
+            self.refresh()
+            if key not in self.files:
+                self.files[key] = self._read(key)
+            return self.files[key]
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_refresh < self.reload_interval:
+            return
+        with self._lock:
+            self.last_refresh = now
+            for key in list(self.files):
+                if key in self.dirty:
+                    # local changes win over external edits
+                    continue
+                try:
+                    mtime = os.stat(self._path(key)).st_mtime_ns
+                except FileNotFoundError:
+                    mtime = None
+                if mtime != self.mtimes.get(key, None):
+                    self.stats["reloads"] += 1
+                    self.files[key] = self._read(key)
+
+    def read_alert(self, title) -> dict:
+        return self._get(title)
+
+    def check(self, title, stocklevel) -> bool:
+        return self._get(title).get(str(stocklevel), False) is True
+
+    def mark(self, title, stocklevel):
+        with self._lock:
+            self._get(title)[str(stocklevel)] = True
+            self.dirty.add(title)
+
+    def general_config(self) -> dict:
+        return self._get(None)
+
+    def set_general(self, key, value):
+        with self._lock:
+            self._get(None)[key] = value
+            self.dirty.add(None)
+
+    def flush(self):
+        with self._lock:
+            for key in list(self.dirty):
+                default_storage.atomic_write(self._path(key), json.dumps(self.files[key], indent=4))
+                self.mtimes[key] = os.stat(self._path(key)).st_mtime_ns
+                self.stats["writes"] += 1
+                self.dirty.discard(key)
@@ -0,0 +1,173 @@
+# Summaries of every tracked edition in one table: time to the first sell out, restocks
+# and the stock at the startDate and at fixed offsets after it.
+# usage: python analytics.py [--output FILE.csv|FILE.json] [--since YYYY-MM-DD] [--offsets HOURS,...] [--workers N]
+import argparse
+import csv
+import datetime
+import json
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import stock_history
+from edition import start_date_timestamp
+from storage import atomic_write
+
+CACHE_FILE = "analytics_cache.json"
+# hours after the startDate the stock is reported for
+OFFSETS = (0, 1, 6, 24, 168)
+
+
+def signature(directory) -> list:
+    # size and modification time of the history and the metadata, a summary is computed again if one changed
+    values = []
+    for filepath in (stock_history.get_history_path(directory), Path(directory) / "metadata.json"):
+        try:
+            stat = filepath.stat()
+            values += [filepath.name, stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            values += [filepath.name, None, None]
+    return values
+
+
+def to_iso(timestamp):
+    if timestamp is None:
+        return None
+    return datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat(timespec="seconds")
+
+
+def summarize_edition(directory, offsets=OFFSETS) -> dict:
+    import numpy as np
+    directory = Path(directory)
+    metadata = {}
+    if (directory / "metadata.json").exists():
+        with open(directory / "metadata.json") as json_file:
+            metadata = json.load(json_file)
+    edition = metadata.get("edition", {})
+    times, stock = stock_history.load_history(stock_history.get_history_path(directory))
+    start_date = edition.get("startDate", None)
+    start = start_date_timestamp(start_date) if start_date else None
+    sold_out = np.flatnonzero(stock == 0)
+    sold_out_at = float(times[sold_out[0]]) if len(sold_out) != 0 else None
+    summary = {"title": directory.name,
+               "size": edition.get("size", None),
+               "start_date": start_date,
+               "records": len(times),
+               "first_record": to_iso(float(times[0])) if len(times) != 0 else None,
+               "last_record": to_iso(float(times[-1])) if len(times) != 0 else None,
+               "last_stock": int(stock[-1]) if len(stock) != 0 else None,
+               "sold_out_at": to_iso(sold_out_at),
+               "hours_to_sell_out": None,
+               # back in stock after being sold out
+               "restocks": int(np.count_nonzero((stock[:-1] == 0) & (stock[1:] > 0)))}
+    if start is not None and sold_out_at is not None:
+        summary["hours_to_sell_out"] = round((sold_out_at - start) / 3600.0, 3)
+    for hours in offsets:
+        value = None
+        if start is not None and len(times) != 0:
+            # last record at or before the point in time, nothing if tracking started later
+            index = np.searchsorted(times, start + hours * 3600.0, side="right") - 1
+            if index >= 0:
+                value = int(stock[index])
+        summary[f"stock_at_{hours}h"] = value
+    return summary
+
+
+def try_summarize_edition(directory, offsets=OFFSETS):
+    # a broken file is reported and analyzed again on the next run instead of failing the whole run
+    try:
+        return summarize_edition(directory, offsets)
+    except (OSError, ValueError, KeyError) as error:
+        print(f"Unable to analyze '{Path(directory).name}':", error)
+        return None
+
+
+def load_cache(filepath) -> dict:
+    try:
+        with open(filepath) as json_file:
+            return json.load(json_file)
+    except FileNotFoundError:
+        return {}
+    except ValueError as error:
+        print(f"Ignoring the analytics cache {filepath}:", error)
+        return {}
+
+
+def analyze(data_dir, offsets=OFFSETS, workers=None, use_cache=True) -> list:
+    """
+    summaries of every title in data_dir, titles whose history and metadata did not change since the last run
+    are taken from the cache in data_dir
+    """
+    data_dir = Path(data_dir)
+    cache_path = data_dir / CACHE_FILE
+    cache = load_cache(cache_path) if use_cache else {}
+    directories = sorted(directory for directory in data_dir.iterdir()
+                         if directory.is_dir() and stock_history.get_history_path(directory).exists())
+    summaries = {}
+    pending = []
+    failed = 0
+    for directory in directories:
+        entry = cache.get(directory.name, None)
+        current = signature(directory)
+        if entry is not None and entry["signature"] == current and entry["offsets"] == list(offsets):
+            summaries[directory.name] = entry["summary"]
+        else:
+            pending.append((directory, current))
+    if len(pending) != 0:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(try_summarize_edition, [directory for directory, _ in pending],
+                               [offsets] * len(pending), chunksize=max(len(pending) // 32, 1))
+            for (directory, current), summary in zip(pending, results):
+                if summary is None:
+                    failed += 1
+                    continue
+                summaries[directory.name] = summary
+                cache[directory.name] = {"signature": current, "offsets": list(offsets), "summary": summary}
+    # titles that were removed from the data directory
+    cache = {title: entry for title, entry in cache.items() if title in summaries}
+    if use_cache:
+        atomic_write(cache_path, json.dumps(cache, separators=(",", ":")))
+    print(f"{len(summaries)} editions, {len(pending) - failed} analyzed, {len(directories) - len(pending)} from the cache"
+          + (f", {failed} failed" if failed != 0 else ""))
+    return [summaries[directory.name] for directory in directories if directory.name in summaries]
+
+
+def write_table(summaries, filepath):
+    filepath = Path(filepath)
+    if filepath.suffix == ".json":
+        atomic_write(filepath, json.dumps(summaries, indent=4))
+        return
+    with open(filepath, 'w+', newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=list(summaries[0]) if len(summaries) != 0 else ["title"])
+        writer.writeheader()
+        writer.writerows(summaries)
+
+
+def print_overview(summaries, offsets=OFFSETS):
+    hours = [summary["hours_to_sell_out"] for summary in summaries if summary["hours_to_sell_out"] is not None]
+    if len(hours) != 0:
+        print(f"sold out: {len(hours)}, median time to sell out: {statistics.median(hours):.1f}h")
+    for offset in offsets:
+        values = [summary[f"stock_at_{offset}h"] for summary in summaries
+                  if summary[f"stock_at_{offset}h"] is not None]
+        if len(values) != 0:
+            print(f"median stock {offset:>4}h after the startDate: {statistics.median(values)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", default="analytics.csv", help="result table, .csv or .json")
+    parser.add_argument("--since", help="only editions with a startDate at or after this date (YYYY-MM-DD)")
+    parser.add_argument("--offsets", default=",".join(str(hours) for hours in OFFSETS),
+                        help="comma separated hours after the startDate to report the stock for")
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to the number of cpus")
+    parser.add_argument("--no-cache", action="store_true", help="analyze every edition again")
+    args = parser.parse_args()
+    offsets = tuple(int(hours) for hours in args.offsets.split(","))
+    summaries = analyze(stock_history.DATA_DIR, offsets=offsets, workers=args.workers, use_cache=not args.no_cache)
+    if args.since:
+        summaries = [summary for summary in summaries
+                     if summary["start_date"] is not None and summary["start_date"][:10] >= args.since]
+    write_table(summaries, args.output)
+    print_overview(summaries, offsets)
+    print(f"written to {args.output}")
@@ -0,0 +1,118 @@
+import asyncio
+
+import aiohttp
+
+import main as tracker
+from metrics import default_metrics as metrics
+
+_session = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    # one pooled session for the whole bot, connections to sapi.displate.com are kept alive between cycles
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=120)
+        _session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def fetch_json(session, url):
+    async with session.get(url) as response:
+        return await response.json(content_type=None)
+
+
+async def manually_check_displate(session, id):
+    with metrics.span("manual_check"):
+        return await fetch_json(session, f"{tracker.general_api_url}/{id}")
+
+
+async def fetch_lookups(session, ids) -> dict:
+    semaphore = asyncio.Semaphore(tracker.MAX_CONCURRENT_LOOKUPS)
+
+    async def bounded_check(le_id):
+        async with semaphore:
+            return await manually_check_displate(session, le_id)
+
+    responses = await asyncio.gather(*[bounded_check(le_id) for le_id in ids])
+    lookups = dict(zip(ids, responses))
+    tracker.record_lookups(lookups)
+    return lookups
+
+
+async def main_async():
+    """
+    Async counterpart of main.main(), the requests run on the shared session
+    and all file reads and writes are moved to a worker thread
+    """
+    output = tracker.new_output()
+    with metrics.span("cycle"):
+        with metrics.span("prepare"):
+            local_data, is_wednesday, time = await asyncio.to_thread(tracker.prepare_cycle)
+        try:
+            session = await get_session()
+            with metrics.span("fetch_listing"):
+                listing, changed = await tracker.listing_fetcher.fetch_async(session, tracker.general_api_url)
+            tracker.record_listing(listing, changed)
+            pending = await asyncio.to_thread(tracker.get_pending_lookups, listing, local_data, is_wednesday)
+            if not tracker.try_short_circuit(changed, pending, output):
+                with metrics.span("lookups"):
+                    lookups = await fetch_lookups(session, pending)
+                with metrics.span("process"):
+                    await asyncio.to_thread(tracker.process_listing, listing, lookups, local_data, is_wednesday,
+                                            output)
+                tracker.finish_cycle(output)
+            tracker.add_estimates(output, time)
+            tracker.observe_cycle(output, is_wednesday)
+        except Exception as error:
+            metrics.incr("errors_total", where="cycle", error=type(error).__name__)
+            print(f"{time=}")
+            print(f"{type(error).__name__}: {error}")
+    return output, time
+
+
+class LoopLagMonitor:
+    """
+    Measures how long the event loop is blocked by sleeping for a short interval
+    and recording how late the loop wakes up again
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - start - self.interval, 0.0)
+            self.max_lag = max(self.max_lag, lag)
+            self.total_lag += lag
+            self.samples += 1
+
+    def reset(self) -> dict:
+        stats = {"max_lag": self.max_lag, "total_lag": self.total_lag, "samples": self.samples}
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.samples = 0
+        return stats
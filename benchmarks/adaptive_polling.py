@@ -0,0 +1,64 @@
+# Simulates a week of polling with a drop on wednesday 17:00 on a simulated clock and compares
+# the adaptive poller with the fixed one minute interval: requests made, delay until the drop is seen
+# and the mean delay between a stock change and the poll that sees it.
+# usage: python -m benchmarks.adaptive_polling [seed]
+import bisect
+import random
+import sys
+
+from adaptive_poller import AdaptivePoller
+
+WEEK_START = 1659304800.0  # monday 2022-08-01 00:00 CEST
+DROP = WEEK_START + 2 * 86400 + 17 * 3600
+WEEK = 7 * 86400
+
+
+def make_change_times(seed=0):
+    """
+    times of stock changes: a burst right after the drop, then a slow daytime trickle
+    """
+    rng = random.Random(seed)
+    times = [DROP + rng.expovariate(1 / 600.0) for _ in range(400)]
+    for day in range(7):
+        for _ in range(30):
+            times.append(WEEK_START + day * 86400 + rng.uniform(8 * 3600, 23 * 3600))
+    return sorted(time for time in times if WEEK_START <= time < WEEK_START + WEEK)
+
+
+def simulate(poller_factory, change_times, phase=17.0):
+    # the polls are not aligned with the full minute of the drop
+    now = WEEK_START + phase
+    clock = {"now": now}
+    poller = poller_factory(lambda: clock["now"])
+    last_poll = now - 60
+    drop_seen = None
+    total_delay = 0.0
+    while now < WEEK_START + WEEK:
+        clock["now"] = now
+        first = bisect.bisect_right(change_times, last_poll)
+        last = bisect.bisect_right(change_times, now)
+        changes = last - first
+        total_delay += sum(now - time for time in change_times[first:last])
+        if drop_seen is None and now >= DROP:
+            drop_seen = now - DROP
+        # like the listing, the edition is only upcoming until its startDate
+        poller.observe(changes, start_dates=[DROP] if now < DROP else [],
+                       early_access=DROP - 86400 * 0.5 <= now <= DROP)
+        last_poll = now
+        now += poller.next_interval()
+    return poller.stats, drop_seen, total_delay / max(len(change_times), 1)
+
+
+class FixedPoller(AdaptivePoller):
+    def next_interval(self, now=None) -> float:
+        return self.default
+
+
+if __name__ == '__main__':
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+    change_times = make_change_times(seed)
+    for name, factory in (("fixed", lambda clock: FixedPoller(clock=clock)),
+                          ("adaptive", lambda clock: AdaptivePoller(clock=clock, rng=random.Random(seed)))):
+        stats, drop_seen, mean_delay = simulate(factory, change_times)
+        print(f"{name:>8}: {stats['polls']:6d} polls, saved {stats['saved']:6d} against a fixed minute, "
+              f"drop seen after {drop_seen:5.1f}s, changes seen after {mean_delay:5.1f}s on average")
@@ -0,0 +1,37 @@
+# Runs tracking cycles against the fake api, with and without conditional request support,
+# and reports how many cycles were short-circuited because the listing did not change.
+# usage: python -m benchmarks.conditional_fetch [cycles]
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import main as tracker
+from benchmarks.fake_api import FakeDisplateAPI, make_listing
+from fetcher import ListingFetcher
+
+
+def run(cycles, conditional, change_every=10):
+    listing = make_listing(active=100)
+    with FakeDisplateAPI(listing=listing, conditional=conditional) as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        tracker.general_api_url = api.url
+        tracker.BASE_DIR = Path(tmp)
+        tracker.listing_fetcher = ListingFetcher()
+        start = time.perf_counter()
+        for cycle in range(cycles):
+            if cycle % change_every == 0:
+                listing["data"][cycle % 100]["edition"]["available"] -= 1
+                api.set_listing(listing)
+            tracker.main()
+        elapsed = time.perf_counter() - start
+        stats = dict(tracker.listing_fetcher.stats)
+        stats["server_304"] = api.not_modified
+    return elapsed, stats
+
+
+if __name__ == '__main__':
+    cycles = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    for conditional in (True, False):
+        elapsed, stats = run(cycles, conditional)
+        print(f"conditional={conditional}: {cycles} cycles in {elapsed:.3f}s, {stats}")
@@ -0,0 +1,72 @@
+# Times snapshot_diff.diff_snapshots against the list based scan main() used before,
+# on synthetic listings with thousands of editions.
+# usage: python -m benchmarks.diff_benchmark [n editions ...]
+import random
+import sys
+import time
+
+from benchmarks.fake_api import make_displate
+from edition import Edition
+from snapshot_diff import build_snapshot, diff_snapshots
+
+
+def make_snapshots(n, seed=0):
+    random.seed(seed)
+    previous = [make_displate(le_id, available=random.randint(1, 1000)) for le_id in range(n)]
+    current = []
+    for displate in previous:
+        roll = random.random()
+        if roll < 0.05:
+            # sold out
+            continue
+        available = displate["edition"]["available"]
+        if roll < 0.3:
+            available -= 1
+        current.append(make_displate(displate["itemCollectionId"], available=available))
+    current += [make_displate(n + le_id) for le_id in range(n // 20)]
+    return previous, current
+
+
+def list_scan_diff(previous, current):
+    changes = 0
+    previous_le_ids = [d["itemCollectionId"] for d in previous]
+    processed_le_ids = []
+    for displate in current:
+        if displate["itemCollectionId"] not in previous_le_ids:
+            changes += 1
+        else:
+            index = previous_le_ids.index(displate["itemCollectionId"])
+            if previous[index]["edition"]["available"] != displate["edition"]["available"]:
+                changes += 1
+        processed_le_ids.append(displate["itemCollectionId"])
+    for previous_le in previous_le_ids:
+        if previous_le not in processed_le_ids:
+            changes += 1
+    return changes
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run(sizes):
+    results = []
+    for n in sizes:
+        previous, current = make_snapshots(n)
+        # the tracker keeps the previous editions, the current ones are parsed from the response
+        previous_editions = [Edition.from_api(displate) for displate in previous]
+        keyed_time, events = timed(lambda: diff_snapshots(build_snapshot(previous_editions),
+                                                          build_snapshot(Edition.from_api(d) for d in current)))
+        scan_time, changes = timed(list_scan_diff, previous, current)
+        assert changes == len(events)
+        results.append({"editions": n, "events": len(events), "keyed_s": keyed_time, "list_scan_s": scan_time})
+    return results
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000, 10000]
+    for result in run(sizes):
+        print(f"{result['editions']:>6} editions, {result['events']:>5} events: "
+              f"keyed {result['keyed_s'] * 1000:9.2f} ms, list scan {result['list_scan_s'] * 1000:9.2f} ms")
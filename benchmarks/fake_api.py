@@ -0,0 +1,140 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_displate(le_id, title=None, status="active", available=500, size=1000,
+                  start_date="2022-08-03 17:00:00"):
+    return {"itemCollectionId": le_id,
+            "title": title if title is not None else f"Limited Edition {le_id}",
+            "edition": {"status": status,
+                        "available": available,
+                        "size": size,
+                        "startDate": start_date},
+            "images": {"main": {"url": f"https://static.displate.com/le/{le_id}.jpg"}}}
+
+
+def make_listing(active=20, upcoming=3, first_id=1000):
+    displates = [make_displate(first_id + index) for index in range(active)]
+    displates += [make_displate(first_id + active + index, status="upcoming", available=0)
+                  for index in range(upcoming)]
+    return {"data": displates}
+
+
+class ScriptedListing:
+    """
+    A listing whose stock moves with every call of advance(): a few editions sell some stock,
+    editions that reach 0 leave the listing and every so often a new upcoming edition appears
+    """
+
+    def __init__(self, active=20, upcoming=3, changes_per_cycle=5, new_upcoming_every=0, seed=0):
+        self.rng = random.Random(seed)
+        self.listing = make_listing(active=active, upcoming=upcoming)
+        self.changes_per_cycle = changes_per_cycle
+        self.new_upcoming_every = new_upcoming_every
+        self.next_id = 1000 + active + upcoming
+        self.cycle = 0
+
+    def advance(self) -> dict:
+        self.cycle += 1
+        active = [d for d in self.listing["data"] if d["edition"]["status"] == "active"]
+        for displate in self.rng.sample(active, min(self.changes_per_cycle, len(active))):
+            displate["edition"]["available"] = max(displate["edition"]["available"] - self.rng.randint(1, 20), 0)
+        self.listing["data"] = [d for d in self.listing["data"]
+                                if d["edition"]["status"] != "active" or d["edition"]["available"] > 0]
+        if self.new_upcoming_every and self.cycle % self.new_upcoming_every == 0:
+            self.listing["data"].append(make_displate(self.next_id, status="upcoming", available=0))
+            self.next_id += 1
+        return self.listing
+
+
+class FakeDisplateAPI:
+    """
+    Local stand-in for sapi.displate.com/artworks/limited,
+    serves the listing and the per id endpoint with an optional artificial latency
+    """
+
+    def __init__(self, listing=None, latency=0.0, conditional=True, etag=True, host="127.0.0.1", port=0):
+        self.listing = listing if listing is not None else make_listing()
+        self.latency = latency
+        # answer If-None-Match / If-Modified-Since with 304 like a cdn would
+        self.conditional = conditional
+        # without an ETag only Last-Modified / If-Modified-Since are used
+        self.etag = etag
+        self.requests = 0
+        self.not_modified = 0
+        self.version = 0
+        self.extra_displates = {}
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/artworks/limited"
+
+    def set_listing(self, listing):
+        self.listing = listing
+        self.version += 1
+
+    def find(self, le_id):
+        for displate in self.listing["data"]:
+            if displate["itemCollectionId"] == le_id:
+                return displate
+        return self.extra_displates.get(le_id, make_displate(le_id, status="active", available=0))
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                api.requests += 1
+                if api.latency:
+                    time.sleep(api.latency)
+                parts = self.path.rstrip("/").split("/")
+                if parts[-1] == "limited":
+                    body = api.listing
+                else:
+                    body = {"data": api.find(int(parts[-1]))}
+                payload = json.dumps(body).encode()
+                etag = f'"{hashlib.md5(payload).hexdigest()}"'
+                last_modified = f"Wed, 03 Aug 2022 17:{api.version // 60 % 60:02d}:{api.version % 60:02d} GMT"
+                if api.conditional and (self.headers.get("If-None-Match") == etag
+                                        or (self.headers.get("If-None-Match") is None
+                                            and self.headers.get("If-Modified-Since") == last_modified)):
+                    api.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                if api.conditional:
+                    if api.etag:
+                        self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", last_modified)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
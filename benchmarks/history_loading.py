@@ -0,0 +1,56 @@
+# Compares loading and preparing a history for a comparison plot,
+# row by row (process_file + crop_data + datetime rebasing) against the numpy loader.
+# usage: python -m benchmarks.history_loading [rows ...]
+import datetime
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import plot
+from benchmarks.synthetic_history import write_csv_history, write_binary_history
+
+START_DATE = datetime.datetime(2022, 8, 3, 17, 0, 0)
+
+
+def prepare_rows(filepath):
+    times, stock = plot.process_file(filepath)
+    times, stock = plot.crop_data(times, stock)
+    base = datetime.datetime(2022, 1, 2)
+    return [base + (timestamp - START_DATE) for timestamp in times], stock
+
+
+def prepare_arrays(filepath):
+    times, stock = plot.load_history(filepath)
+    times, stock = plot.crop_arrays(times, stock)
+    return plot.rebase_date_numbers(plot.to_date_numbers(times), START_DATE), stock
+
+
+def timed(function, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            csv_path = write_csv_history(Path(tmp, f"{rows}.csv"), rows)
+            binary_path = write_binary_history(Path(tmp, f"{rows}.bin"), rows)
+            results.append({"rows": rows,
+                            "rows_csv_s": timed(prepare_rows, csv_path),
+                            "numpy_csv_s": timed(prepare_arrays, csv_path),
+                            "numpy_binary_s": timed(prepare_arrays, binary_path)})
+    return results
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10 ** 5, 10 ** 6]
+    for result in run(sizes):
+        print(f"{result['rows']:>8} rows: row by row {result['rows_csv_s']:7.3f}s, "
+              f"numpy csv {result['numpy_csv_s']:7.3f}s, numpy binary {result['numpy_binary_s']:7.3f}s")
@@ -0,0 +1,48 @@
+# Measures how long one tracking cycle blocks the event loop,
+# once with the blocking main.main() and once with async_tracker.main_async().
+# usage: python -m benchmarks.loop_lag [latency in seconds]
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+import main as tracker
+import async_tracker
+from benchmarks.fake_api import FakeDisplateAPI, make_listing
+
+
+async def measure(cycle, cycles=3):
+    monitor = async_tracker.LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    monitor.reset()
+    for _ in range(cycles):
+        await cycle()
+    await asyncio.sleep(0.05)
+    stats = monitor.reset()
+    monitor.stop()
+    return stats
+
+
+async def run(latency):
+    with FakeDisplateAPI(listing=make_listing(active=50), latency=latency) as api, \
+            tempfile.TemporaryDirectory() as tmp:
+        tracker.general_api_url = api.url
+        tracker.BASE_DIR = Path(tmp)
+
+        async def blocking_cycle():
+            tracker.main()
+
+        async def async_cycle():
+            await async_tracker.main_async()
+
+        before = await measure(blocking_cycle)
+        after = await measure(async_cycle)
+        await async_tracker.close_session()
+    for name, stats in (("main()", before), ("main_async()", after)):
+        print(f"{name:>14}: max loop lag {stats['max_lag'] * 1000:8.1f} ms, "
+              f"total {stats['total_lag'] * 1000:8.1f} ms over {stats['samples']} samples")
+
+
+if __name__ == '__main__':
+    asyncio.run(run(latency=float(sys.argv[1]) if len(sys.argv) > 1 else 0.2))
@@ -0,0 +1,55 @@
+# Measures the startup of the bot: importing displate_bot.py in a fresh interpreter (what happens before
+# the gateway connection starts) and the first /plot after a restart, with cold and with warmed up render workers.
+# usage: python -m benchmarks.startup [rows]
+import asyncio
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import stock_history
+from benchmarks.synthetic_history import write_csv_history
+from plot_cache import default_cache
+from render_pool import RenderPool
+
+ROOT = Path(__file__).parent.parent
+
+
+def import_time(module, repeat=3) -> float:
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    samples = [float(subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                    check=True).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    return min(samples)
+
+
+async def first_plot(title, warm_up) -> tuple:
+    pool = RenderPool(workers=1)
+    default_cache.invalidate(title)
+    start = time.perf_counter()
+    if warm_up:
+        await pool.warm_up()
+    ready = time.perf_counter() - start
+    start = time.perf_counter()
+    await pool.plot_stock_history(name=title, style="default")
+    pool.shutdown()
+    return ready, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 5
+    for module in ("main", "async_tracker", "plot"):
+        print(f"import {module:>14}: {import_time(module) * 1000:8.1f} ms")
+    if (ROOT / "bot_config.json").exists():
+        print(f"import {'displate_bot':>14}: {import_time('displate_bot') * 1000:8.1f} ms")
+    with tempfile.TemporaryDirectory() as tmp:
+        stock_history.DATA_DIR = Path(tmp)
+        title = "Startup Benchmark"
+        write_csv_history(Path(tmp) / title / stock_history.CSV_HISTORY_FILE, rows)
+        with open(Path(tmp) / title / "metadata.json", 'w+') as file:
+            json.dump({"title": title, "edition": {"startDate": "2022-08-03 17:00:00"}}, file)
+        for warm_up in (False, True):
+            ready, plot_time = asyncio.run(first_plot(title, warm_up))
+            name = "warmed up" if warm_up else "cold"
+            print(f"first /plot, {name:>9} workers: {plot_time * 1000:8.1f} ms (warm up took {ready * 1000:.1f} ms)")
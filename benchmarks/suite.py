@@ -0,0 +1,186 @@
+# Benchmark suite for the hot paths of the tracker and the bot, writes machine readable results
+# so runs of different revisions can be compared.
+# usage: python -m benchmarks.suite [--quick] [--only NAME ...] [--output FILE]
+#        python -m benchmarks.suite --compare OLD.json NEW.json
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import stock_history
+from benchmarks.fake_api import FakeDisplateAPI, ScriptedListing
+from benchmarks.synthetic_history import write_csv_history
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def summarize(benchmark, scale, samples, **extra) -> dict:
+    samples = sorted(samples)
+    result = {"benchmark": benchmark,
+              "scale": scale,
+              "runs": len(samples),
+              "mean_s": statistics.fmean(samples),
+              "min_s": samples[0],
+              "p95_s": samples[min(int(len(samples) * 0.95), len(samples) - 1)]}
+    result.update(extra)
+    return result
+
+
+def use_data_dir(base_dir, api_url=None):
+    # point the tracker at a scratch directory with fresh in-memory state
+    import main as tracker
+    tracker.use_base_dir(base_dir)
+    if api_url is not None:
+        tracker.general_api_url = api_url
+    return tracker
+
+
+def bench_tracker_cycle(scales, cycles):
+    results = []
+    for active in scales:
+        script = ScriptedListing(active=active, upcoming=3, changes_per_cycle=max(active // 20, 1),
+                                 new_upcoming_every=10)
+        with FakeDisplateAPI(listing=script.listing) as api, tempfile.TemporaryDirectory() as tmp:
+            tracker = use_data_dir(tmp, api.url)
+            samples = []
+            with contextlib.redirect_stdout(io.StringIO()):
+                # the first cycle sees every edition as new and writes all metadata
+                first = timed(tracker.main)
+                for _ in range(cycles):
+                    api.set_listing(script.advance())
+                    samples.append(timed(tracker.main))
+                unchanged = [timed(tracker.main) for _ in range(cycles)]
+        results.append(summarize("main_cycle", active, samples, first_cycle_s=first))
+        results.append(summarize("main_cycle_unchanged", active, unchanged))
+    return results
+
+
+def bench_process_file(scales, repeat):
+    import plot
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in scales:
+            filepath = write_csv_history(Path(tmp, f"{rows}.csv"), rows)
+            results.append(summarize("process_file", rows, [timed(plot.process_file, filepath)
+                                                           for _ in range(repeat)]))
+            results.append(summarize("load_history", rows, [timed(plot.load_history, filepath)
+                                                           for _ in range(repeat)]))
+    return results
+
+
+def bench_plots(scales, repeat, style):
+    import plot
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        use_data_dir(tmp)
+        for rows in scales:
+            titles = [f"Benchmark {rows} {index}" for index in range(20)]
+            for index, title in enumerate(titles):
+                write_csv_history(stock_history.DATA_DIR / title / stock_history.CSV_HISTORY_FILE, rows,
+                                  seed=index)
+                with open(stock_history.DATA_DIR / title / "metadata.json", 'w+') as file:
+                    json.dump({"title": title, "edition": {"startDate": "2022-08-03 17:00:00"}}, file)
+            with contextlib.redirect_stdout(io.StringIO()):
+                history = [timed(plot.plot_stock_history, name=titles[0], style=style, print_to_console=False,
+                                 use_cache=False) for _ in range(repeat)]
+                compare = [timed(plot.plot_compare, names=titles[:2], style=style, use_cache=False)
+                           for _ in range(repeat)]
+                # the first comparison parses all histories, the following ones reuse the parsed arrays
+                compare_many = [timed(plot.plot_compare, names=titles, style=style, use_cache=False)
+                                for _ in range(repeat)]
+            results.append(summarize("plot_stock_history", rows, history))
+            results.append(summarize("plot_compare", rows, compare))
+            results.append(summarize("plot_compare_20", rows, compare_many, first_s=compare_many[0]))
+    return results
+
+
+def bench_regular_alert(scales, calls):
+    # needs disnake and bot_config.json, the bot itself is not started
+    import displate_bot
+    results = []
+    start = datetime.datetime(2022, 8, 1, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))
+    for deltas_per_day in scales:
+        with tempfile.TemporaryDirectory() as tmp:
+            use_data_dir(tmp)
+            step = 86400 // deltas_per_day
+            config = {"delta": {"everyday": [index * step for index in range(deltas_per_day)]},
+                      "last_timestamp": start.timestamp()}
+            (Path(tmp) / "data").mkdir()
+            with open(Path(tmp) / "data/general_alerts.json", 'w+') as file:
+                json.dump(config, file)
+            times = [start + datetime.timedelta(minutes=minute) for minute in range(calls)]
+            samples = [timed(displate_bot.check_time_for_regular_alert, current_time=now) for now in times]
+        results.append(summarize("check_time_for_regular_alert", deltas_per_day, samples))
+    return results
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old_path, new_path):
+    with open(old_path) as file:
+        old = {(r["benchmark"], r["scale"]): r for r in json.load(file)["results"]}
+    with open(new_path) as file:
+        new = json.load(file)["results"]
+    for result in new:
+        previous = old.get((result["benchmark"], result["scale"]), None)
+        ratio = f"{result['mean_s'] / previous['mean_s']:6.2f}x" if previous else "   new"
+        print(f"{result['benchmark']:>30} {result['scale']:>8}: {result['mean_s'] * 1000:10.3f} ms {ratio}")
+
+
+BENCHMARKS = {
+    "tracker": lambda args: bench_tracker_cycle([20, 200, 2000] if not args.quick else [20, 200],
+                                                cycles=20 if not args.quick else 5),
+    "history": lambda args: bench_process_file([10 ** 4, 10 ** 5, 10 ** 6] if not args.quick else [10 ** 4, 10 ** 5],
+                                               repeat=3),
+    "plot": lambda args: bench_plots([10 ** 3, 10 ** 5] if not args.quick else [10 ** 3], repeat=3,
+                                     style=args.style),
+    "regular_alert": lambda args: bench_regular_alert([1, 24, 1440], calls=1440 if not args.quick else 240),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="smaller scales and fewer repetitions")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--style", default="seaborn-dark", help="matplotlib style of the plot benchmarks")
+    parser.add_argument("--output", help="result file, defaults to benchmarks/results/REVISION.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        results = []
+        for name in args.only:
+            for result in BENCHMARKS[name](args):
+                print(f"{result['benchmark']:>30} {result['scale']:>8}: mean {result['mean_s'] * 1000:10.3f} ms, "
+                      f"p95 {result['p95_s'] * 1000:10.3f} ms")
+                results.append(result)
+        current_revision = revision()
+        output = Path(args.output) if args.output else RESULTS_DIR / f"{current_revision}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w+') as file:
+            json.dump({"revision": current_revision,
+                       "python": platform.python_version(),
+                       "machine": platform.machine(),
+                       "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                       "results": results}, file, indent=4)
+        print(f"results written to {output}")
@@ -0,0 +1,46 @@
+import csv
+import math
+import random
+from pathlib import Path
+
+from stock_history import RECORD
+
+
+def generate_history(rows, start=1659538800.0, size=1000, interval=60.0, seed=0):
+    """
+    yields (timestamp, stock) rows of a scripted sell-through: a fast drop after the start, a slow tail,
+    the first sell out after two thirds of the rows and small restocks afterwards
+    """
+    rng = random.Random(seed)
+    stock = size
+    timestamp = start
+    sold_out_at = max(rows * 2 // 3, 1)
+    for row in range(rows):
+        timestamp += rng.expovariate(1.0 / interval)
+        if row == sold_out_at:
+            stock = 0
+        elif row > sold_out_at:
+            stock = max(stock + rng.choice((-1, -1, 0, 2)), 0)
+        else:
+            # quadratic sell-through curve towards the first sell out
+            stock = max(min(stock, math.ceil(size * (1 - row / sold_out_at) ** 2)), 1)
+        yield timestamp, stock
+
+
+def write_csv_history(filepath, rows, **kwargs):
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'w+') as file:
+        writer = csv.writer(file)
+        writer.writerow(["datetime", "available_stock"])
+        writer.writerows(generate_history(rows, **kwargs))
+    return filepath
+
+
+def write_binary_history(filepath, rows, **kwargs):
+    filepath = Path(filepath)
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'wb') as file:
+        for timestamp, stock in generate_history(rows, **kwargs):
+            file.write(RECORD.pack(timestamp, stock))
+    return filepath
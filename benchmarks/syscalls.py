@@ -0,0 +1,93 @@
+# Counts the file system calls of steady-state tracking cycles: every cycle a few editions sell some stock,
+# the directories, metadata and history files of all editions exist already. The listing is served from
+# memory, so only the file access of the tracker is counted.
+# usage: python -m benchmarks.syscalls [active] [cycles]
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.fake_api import ScriptedListing
+from benchmarks.suite import use_data_dir
+from replay import ReplayFetcher
+
+counts = Counter()
+counting = False
+# audit events of the calls that are not wrapped below
+AUDIT_EVENTS = {"open": "open", "os.mkdir": "mkdir", "os.rename": "rename", "os.replace": "rename",
+                "os.remove": "unlink", "os.listdir": "listdir", "os.scandir": "listdir"}
+
+
+def audit(event, args):
+    if counting and event in AUDIT_EVENTS:
+        counts[AUDIT_EVENTS[event]] += 1
+
+
+def wrap(name):
+    # os.stat has no audit event, pathlib looks it up on the os module for every call
+    original = getattr(os, name)
+
+    def counted(*args, **kwargs):
+        if counting:
+            counts["stat"] += 1
+        return original(*args, **kwargs)
+
+    setattr(os, name, counted)
+
+
+def io_calls() -> Counter:
+    # read and write system calls of this process, linux only
+    try:
+        with open("/proc/self/io") as file:
+            values = dict(line.split(": ") for line in file.read().splitlines())
+        return Counter(read=int(values["syscr"]), write=int(values["syscw"]))
+    except (OSError, KeyError):
+        return Counter()
+
+
+def count_cycles(active=50, cycles=200, changes_per_cycle=5) -> dict:
+    global counting
+    script = ScriptedListing(active=active, upcoming=3, changes_per_cycle=changes_per_cycle)
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        tracker = use_data_dir(tmp)
+        fetcher = tracker.listing_fetcher = ReplayFetcher()
+
+        def cycle():
+            # a decoded response never shares its dicts with the previous one
+            fetcher.set_response(json.loads(json.dumps(script.advance())))
+            tracker.main()
+
+        for _ in range(3):
+            cycle()
+        counts.clear()
+        before = io_calls()
+        start = time.perf_counter()
+        counting = True
+        try:
+            for _ in range(cycles):
+                cycle()
+        finally:
+            counting = False
+        seconds = time.perf_counter() - start
+        after = io_calls()
+        tracker.storage.close()
+    result = {name: value / cycles for name, value in counts.items()}
+    result.update({name: value / cycles for name, value in (after - before).items()})
+    result["ms"] = seconds / cycles * 1000
+    return result
+
+
+if __name__ == '__main__':
+    sys.addaudithook(audit)
+    wrap("stat")
+    wrap("lstat")
+    active = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    cycles = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    result = count_cycles(active=active, cycles=cycles)
+    print(f"{active} active editions, 5 stock changes per cycle, {cycles} cycles")
+    for name, value in sorted(result.items()):
+        print(f"{name:>8}: {value:8.2f} per cycle")
@@ -0,0 +1,444 @@
+import time as clock
+
+# startup is measured from here: imports, connecting to the gateway and the background warm up
+startup_started = clock.perf_counter()
+
+import asyncio
+import datetime
+from typing import Union
+
+import disnake
+from disnake.ext import tasks, commands
+from disnake.ext.commands import Bot
+from pathlib import Path
+import json
+from adaptive_poller import configure as configure_poller
+from main import get_abbreviations as get_abbr, add_abbreviations as add_abbr, get_alert_state, poller, \
+    warm_up as warm_up_tracker, get_title_index, format_alert_message, enable_recording
+from sales_rate import format_duration
+from async_tracker import main_async as track_stock, LoopLagMonitor, get_session
+from plot_cache import default_cache as plot_cache
+from render_pool import RenderPool, RenderQueueFull
+from alert_delivery import AlertDelivery
+from regular_schedule import RegularSchedule
+import stock_history
+from reveal_images import get_reveal_image
+from metrics import default_metrics as metrics, configure as configure_metrics
+
+config_path = Path(__file__).parent / "bot_config.json"
+if config_path.exists():
+    with open(config_path) as file:
+        config = json.load(file)
+else:
+    raise Exception(f"Config is not available at {config_path=}")
+
+if config.get("plot_cache_dir", None) is not None:
+    # optional on-disk tier for rendered plots, survives restarts of the bot
+    plot_cache.enable_disk_cache(Path(__file__).parent / config["plot_cache_dir"])
+
+intents = disnake.Intents(message_content=True, messages=True)
+
+stock_data = {"time": None, "stock": {}, "eta": {}}
+
+loop_lag_monitor = LoopLagMonitor()
+
+render_pool = RenderPool(workers=config.get("render_workers", 2),
+                         resolve_title=lambda name: get_title_index().resolve(name))
+# upper bound of titles in one comparison, more are not readable in one plot
+MAX_COMPARE_TITLES = 30
+
+bot = Bot(command_prefix=commands.when_mentioned_or(config["prefix"]), intents=intents)
+
+# environments of config["channels"] that receive alerts, stock updates and reveals
+delivery = AlertDelivery(bot, config["channels"], environments=config.get("delivery_environments", ["test"]))
+MAX_EMBED_FIELDS = 25
+
+regular_schedule = None
+regular_schedule_version = None
+warm_up_task = None
+# the event loop only keeps weak references to tasks, running reveals are kept here until they are done
+background_tasks = set()
+
+metrics.observe("startup_imports", clock.perf_counter() - startup_started)
+
+
+@bot.event
+async def on_ready() -> None:
+    """
+    The code in this even is executed when the bot is ready
+    """
+    print(f"Logged in as {bot.user.name}")
+    print(f"disnake API version: {disnake.__version__}")
+    print("-------------------")
+    loop_lag_monitor.start()
+    global warm_up_task
+    if warm_up_task is None:
+        # on_ready is called again after every reconnect
+        ready = clock.perf_counter() - startup_started
+        metrics.observe("startup_ready", ready)
+        print(f"ready {ready:.2f}s after start")
+        warm_up_task = asyncio.get_running_loop().create_task(warm_up())
+    for server in bot.guilds:
+        if server.id not in config["valid_servers"]:
+            await server.leave()
+    if not tracking_task.is_running():
+        tracking_task.start()
+
+
+async def warm_up():
+    """
+    runs in the background after the first on_ready: starts the render workers, loads the caches of the tracker
+    and renders the plots of the active editions, so the first commands after a restart are answered quickly
+    """
+    try:
+        await render_pool.warm_up()
+        titles = await asyncio.to_thread(warm_up_tracker)
+        workers_ready = clock.perf_counter() - startup_started
+        metrics.observe("startup_warm_up", workers_ready)
+        if config.get("prerender_plots", True):
+            for title in titles:
+                try:
+                    await render_pool.plot_stock_history(name=title, style="seaborn-dark")
+                except (FileNotFoundError, RenderQueueFull, asyncio.TimeoutError):
+                    pass
+        print(f"warm up finished {clock.perf_counter() - startup_started:.2f}s after start "
+              f"(render workers ready after {workers_ready:.2f}s, plots of {len(titles)} active editions rendered)")
+    except Exception as error:
+        metrics.incr("errors_total", where="warm_up", error=type(error).__name__)
+        print(f"{type(error).__name__}: {error}")
+
+
+@bot.event
+async def on_server_join(server):
+    if server.id not in config["valid_servers"]:
+        await server.leave()
+
+
+@tasks.loop(minutes=1.0)
+async def tracking_task():
+    try:
+        await bot.wait_until_ready()
+        loop_lag_monitor.reset()
+        response, time = await track_stock()
+        print(f"{str(time)}, {response}")
+        lag = loop_lag_monitor.reset()
+        print(f"max event loop lag during tracking cycle: {lag['max_lag'] * 1000:.1f} ms")
+        interval = poller.next_interval()
+        until_update = seconds_until_regular_update(time)
+        if until_update is not None:
+            # the regular update is sent by the first cycle after its scheduled time, it must not wait for the ceiling
+            interval = min(interval, until_update)
+        tracking_task.change_interval(seconds=interval)
+        print(f"next poll in {interval:.0f}s, {poller.stats}")
+        # print(response)
+
+        alerts = response.get("alert", {})
+        stock = response.get("stock", {})
+        next_le = response.get("next_upcoming_LE", {})
+
+        global stock_data
+        stock_data = {"time": time, "stock": stock, "eta": response.get("eta", {})}
+
+        if len(alerts) != 0:
+            message = format_alert_message(alerts)
+            if message != "":
+                delivery.send("alert", content=message)
+                for kind, titles in alerts.items():
+                    if len(titles) != 0:
+                        metrics.incr("alerts_sent_total", len(titles), kind=kind)
+
+        if len(stock) != 0:
+            time_for_regular_alert = check_time_for_regular_alert(current_time=time)
+            if time_for_regular_alert:
+                titles = list(stock)
+                # an embed holds at most 25 fields
+                for start in range(0, len(titles), MAX_EMBED_FIELDS):
+                    embed = disnake.Embed(
+                        title=f"**Regular Stock Update for {time.strftime('%B %d %H:%M')} CET**",
+                        colour=0xF0C43F,
+                    )
+                    # message = empty_message = ""
+                    for title in titles[start:start + MAX_EMBED_FIELDS]:
+                        embed.add_field(name=f'{title}',
+                                        value=f'> Stock: {stock[title]}'
+                                              f'{format_estimate(stock_data["eta"].get(title, None), time)}',
+                                        inline=False)
+                        # message += f"current stock for '{title}':  {stock[title]}\n"
+                    embed.timestamp = time
+                    delivery.send("stock_update", embed=embed)
+                if len(titles) != 0:
+                    metrics.incr("regular_updates_sent_total")
+                    store_last_alert(timestamp=time.timestamp())
+
+        if len(next_le) != 0:
+            # the image is downloaded in the background, the next poll does not wait for it
+            task = asyncio.get_running_loop().create_task(post_reveal(next_le))
+            background_tasks.add(task)
+            task.add_done_callback(background_tasks.discard)
+    except Exception as error:
+        metrics.incr("errors_total", where="tracking_task", error=type(error).__name__)
+        print(f"{type(error).__name__}: {error}")
+    finally:
+        metrics.end_cycle(max_loop_lag=round(loop_lag_monitor.max_lag, 6))
+
+
+async def post_reveal(next_le):
+    title = next_le["title"]
+    start_date = next_le["startDate"]
+    image_url = next_le["image"]
+    # message = f"{title}\n{image_url}"
+    date = start_date.split()[0].split("-")
+    content = f"{date[1]}/{date[2]}/{date[0]} - {title}"
+    try:
+        image = await get_reveal_image(await get_session(), stock_history.DATA_DIR / title, image_url,
+                                       max_size=config.get("reveal_image_max_size", None))
+    except Exception as error:
+        metrics.incr("errors_total", where="reveal_image", error=type(error).__name__)
+        print(f"Unable to download the reveal image of '{title}': {type(error).__name__}: {error}")
+        delivery.send("reveal", content=f"{content}\n{image_url}")
+        return
+    # every send attempt reads the cached file again instead of downloading it
+    delivery.send("reveal", content=content,
+                  file_factory=lambda: disnake.File(image, filename=f"reveal{image.suffix}"))
+
+
+def format_estimate(estimate, time) -> str:
+    # empty if nothing was sold recently
+    if estimate is None or estimate["sell_out"] is None:
+        return ""
+    rate = next(rate for rate in estimate["rates"].values() if rate > 0)
+    return (f'\n> Selling {rate:.1f}/h, sold out in ~{format_duration(estimate["sell_out"] - time.timestamp())}'
+            f' (<t:{int(estimate["sell_out"])}:t>)')
+
+
+def get_general_alert_config() -> dict:
+    return get_alert_state().general_config()
+
+
+def store_last_alert(timestamp):
+    alert_state = get_alert_state()
+    alert_state.set_general("last_timestamp", timestamp)
+    alert_state.flush()
+
+
+def get_regular_schedule() -> RegularSchedule:
+    # compiled again only if the general alert config was (re)loaded
+    global regular_schedule, regular_schedule_version
+    alert_state = get_alert_state()
+    deltas = alert_state.general_config().get("delta", {})
+    if regular_schedule is None or regular_schedule_version != alert_state.general_version:
+        regular_schedule = RegularSchedule(deltas)
+        regular_schedule_version = alert_state.general_version
+    return regular_schedule
+
+
+def check_time_for_regular_alert(current_time) -> bool:
+    last_alert = get_general_alert_config().get("last_timestamp", None)
+    return get_regular_schedule().is_due(current_time, last_alert)
+
+
+def seconds_until_regular_update(current_time):
+    # None without a schedule, measured from now since the cycle started at current_time
+    next_update = get_regular_schedule().next_fire_time(current_time.replace(tzinfo=None))
+    if next_update is None:
+        return None
+    now = datetime.datetime.now(tz=current_time.tzinfo).replace(tzinfo=None)
+    return max((next_update - now).total_seconds(), 1.0)
+
+
+@bot.slash_command(description="Returns the current cache of the stock level")
+async def stock(inter):
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    try:
+        embed = disnake.Embed(
+            title="**Stock Report**",
+            colour=0xF0C43F,
+        )
+        if len(stock_data["stock"]) != 0:
+            for title in stock_data["stock"]:
+                embed.add_field(name=f'{title}',
+                                value=f'> Stock: {stock_data["stock"][title]}',
+                                inline=False)
+            embed.timestamp = stock_data["time"]
+        else:
+            embed.description = "sorry, no stock data available"
+        await inter.edit_original_message(embed=embed)
+    except Exception as ignore:
+        await inter.edit_original_message("Sorry, an error occurred during processing")
+
+
+@bot.slash_command(description="Shows how fast Limited Editions sell and when they are expected to sell out")
+async def eta(inter, displate_name: Union[str, None] = None):
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    try:
+        titles = list(stock_data["stock"])
+        if displate_name is not None:
+            title = get_title_index().resolve(displate_name) or displate_name
+            titles = [title] if title in stock_data["stock"] else []
+        embed = disnake.Embed(
+            title="**Sell-out Estimates**",
+            colour=0xF0C43F,
+        )
+        for title in titles:
+            estimate = stock_data["eta"].get(title, None)
+            value = format_estimate(estimate, stock_data["time"]).lstrip("\n")
+            if value == "":
+                value = "> no sales within the last day"
+            embed.add_field(name=f'{title}',
+                            value=f'> Stock: {stock_data["stock"][title]}\n{value}',
+                            inline=False)
+        if len(titles) != 0:
+            embed.timestamp = stock_data["time"]
+        else:
+            embed.description = "sorry, no stock data available for this displate"
+        await inter.edit_original_message(embed=embed)
+    except Exception as ignore:
+        await inter.edit_original_message("Sorry, an error occurred during processing")
+
+
+@tracking_task.before_loop  # it's called before the actual task runs
+async def before_tracking_task():
+    await bot.wait_until_ready()
+
+
+@bot.slash_command(description="Plot the stock evolution for one Displate Limited-Edition")
+async def plot(inter, displate_name: str):
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    try:
+        try:
+            image = await render_pool.plot_stock_history(name=displate_name, style="seaborn-dark")
+            await inter.edit_original_message(file=disnake.File(image, "image.png"))
+            print(f"plot cache: {plot_cache.stats}")
+            # await inter.response.send_message(file=disnake.File(image, "image.png"))
+        except FileNotFoundError as error:
+            await inter.edit_original_message("Sorry, I do not have the data for this displate")
+            # await inter.response.send_message("Sorry, I do not have the data for this displate")
+        except RenderQueueFull as error:
+            await inter.edit_original_message("Sorry, too many plots are being rendered right now, please try again")
+        except asyncio.TimeoutError as error:
+            await inter.edit_original_message("Sorry, rendering this plot took too long")
+    except Exception as ignore:
+        await inter.edit_original_message("Sorry, an error occurred during processing")
+        # await inter.response.send_message("Sorry, an error occurred during processing")
+
+
+@bot.slash_command(description="Plot and compare the stock evolution of several Displate Limited-Editions")
+async def compare(inter,
+                  displates: Union[str, None] = None,
+                  released_after: Union[str, None] = None,
+                  released_before: Union[str, None] = None,
+                  ):
+    """
+    displates is a comma separated list of titles or abbreviations, released_after and released_before
+    add every edition with a startDate in that range (YYYY-MM-DD)
+    """
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    try:
+        names = [name.strip() for name in (displates or "").split(",") if name.strip() != ""]
+        if released_after is not None or released_before is not None:
+            names += await asyncio.to_thread(stock_history.titles_released_between, released_after or "0000-01-01",
+                                             released_before)
+        names = list(dict.fromkeys(names))
+        print(f"{names=}")
+        if len(names) < 2:
+            await inter.edit_original_message("Please provide at least two displates or a range of release dates")
+            return
+        if len(names) > MAX_COMPARE_TITLES:
+            await inter.edit_original_message(f"Sorry, I can compare at most {MAX_COMPARE_TITLES} displates at once, "
+                                              f"{len(names)} were selected")
+            return
+        try:
+            image = await render_pool.plot_compare(names=names, style="seaborn-dark")
+            await inter.edit_original_message(file=disnake.File(image, "image.png"))
+        except FileNotFoundError as error:
+            await inter.edit_original_message("Sorry, I do not have the data to compare these displates")
+        except RenderQueueFull as error:
+            await inter.edit_original_message("Sorry, too many plots are being rendered right now, please try again")
+        except asyncio.TimeoutError as error:
+            await inter.edit_original_message("Sorry, rendering this comparison took too long")
+    except Exception as ignore:
+        await inter.edit_original_message("Sorry, an error occurred during processing")
+
+
+@bot.slash_command(description="get all abbreviations used by the Discord Tracker.")
+async def get_abbreviations(inter, title: Union[str, None] = None):
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    abbreviations = get_abbr()
+    try:
+        embed = disnake.Embed(
+            # title="**Stock Report**",
+            colour=0xF0C43F,
+        )
+        if len(abbreviations) != 0:
+            for key in abbreviations:
+                if title is None or title == abbreviations[key]:
+                    embed.add_field(name=f'{abbreviations[key]}',
+                                    value=f'> abbreviation: {key}',
+                                    inline=False)
+        else:
+            embed.description = "sorry, no abbreviations available"
+        await inter.edit_original_message(embed=embed)
+    except Exception as ignore:
+        await inter.edit_original_message("Sorry, an error occurred during processing")
+
+
+@bot.slash_command(description="Plot and compare the stock evolution for two Displate Limited-Editions")
+async def add_abbreviation(inter, abbreviation, full_name):
+    if not inter.guild:
+        if inter.author.id not in config["owners"]:
+            return
+    await inter.response.defer()
+    success = add_abbr(abbreviation=abbreviation, title=full_name)
+    if success:
+        await inter.edit_original_message(f"I have added the abbreviation '{abbreviation}' for the title '{full_name}'")
+    else:
+        await inter.edit_original_message(f"I have **not** added the abbreviation '{abbreviation}'"
+                                          f" for the title '{full_name}'. \n"
+                                          f"Probably the given title is not included in the available data.")
+
+    pass
+
+
+@plot.autocomplete("displate_name")
+@eta.autocomplete("displate_name")
+@add_abbreviation.autocomplete("full_name")
+async def autocomplete_title(inter, user_input: str):
+    return get_title_index().complete(user_input)
+
+
+@compare.autocomplete("displates")
+async def autocomplete_titles(inter, user_input: str):
+    # completes the last entry of the comma separated list
+    head, _, last = user_input.rpartition(",")
+    prefix = f"{head.strip()}, " if head.strip() != "" else ""
+    return [prefix + title for title in get_title_index().complete(last) if len(prefix + title) <= 100]
+
+
+def run():
+    configure_metrics(metrics, jsonl_file=config.get("metrics_file", None), port=config.get("metrics_port", None))
+    configure_poller(poller, floor=config.get("poll_floor", None), ceiling=config.get("poll_ceiling", None),
+                     default=config.get("poll_default", None))
+    if config.get("record_file", None) is not None:
+        enable_recording(Path(__file__).parent / config["record_file"])
+    else:
+        enable_recording()
+    bot.run(config["token"])
+
+
+if __name__ == '__main__':
+    run()
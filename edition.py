@@ -0,0 +1,63 @@
+import datetime
+
+import pytz
+
+
+def start_date_timestamp(start_date) -> float:
+    # startDate of the api is given in CET
+    naive = datetime.datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S')
+    return pytz.timezone('CET').localize(naive).timestamp()
+
+
+class Edition:
+    """
+    The fields of a limited edition the tracker uses, taken from a displate of the api when the listing is
+    decoded. The rest of the response (artist, all images, descriptions, ...) is not kept between cycles
+    """
+    __slots__ = ("le_id", "title", "status", "available", "size", "start_date", "image")
+
+    def __init__(self, le_id, title, status, available=None, size=None, start_date=None, image=None):
+        self.le_id = le_id
+        self.title = title
+        self.status = status
+        self.available = available
+        self.size = size
+        self.start_date = start_date
+        self.image = image
+
+    @classmethod
+    def from_api(cls, displate) -> "Edition":
+        edition = displate.get("edition", {})
+        return cls(displate["itemCollectionId"],
+                   displate.get("title", None),
+                   edition.get("status", None),
+                   edition.get("available", None),
+                   edition.get("size", None),
+                   edition.get("startDate", None),
+                   displate.get("images", {}).get("main", {}).get("url", None))
+
+    def __repr__(self):
+        return f"Edition({self.le_id}, {self.title!r}, {self.status!r}, available={self.available})"
+
+
+class Listing:
+    """
+    The active and upcoming editions of a listing response, in the order of the listing.
+    The decoded response is only kept until release() is called once the cycle that fetched it was processed,
+    it is needed for the metadata.json of new titles and the response log
+    """
+    __slots__ = ("active", "upcoming", "response")
+
+    def __init__(self, response):
+        self.active = []
+        self.upcoming = []
+        self.response = response
+        for displate in response["data"]:
+            edition = Edition.from_api(displate)
+            if edition.status == "active":
+                self.active.append(edition)
+            elif edition.status == "upcoming":
+                self.upcoming.append(edition)
+
+    def release(self):
+        self.response = None
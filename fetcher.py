@@ -0,0 +1,85 @@
+import hashlib
+import json
+
+from edition import Listing
+
+_session = None
+
+
+def get_session():
+    # keep-alive connection pool shared by all blocking requests to the api
+    global _session
+    if _session is None:
+        # imported on first use, the bot only uses the aiohttp session of async_tracker
+        import requests
+        from requests.adapters import HTTPAdapter
+        _session = requests.Session()
+        _session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=10))
+        _session.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=10))
+    return _session
+
+
+class ListingFetcher:
+    """
+    Fetches the limited editions listing with conditional requests (ETag / If-Modified-Since).
+    If the server does not support them, the response body is hashed instead,
+    an unchanged listing is neither decoded nor processed again.
+    The validators of a response only become active after commit() was called,
+    so a cycle that failed halfway is processed again on the next fetch.
+    Only the parsed editions of the committed listing are kept, its decoded response is released
+    """
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.body_hash = None
+        self.listing = None
+        self._pending = None
+        self.stats = {"requests": 0,
+                      "not_modified": 0,
+                      "same_body": 0,
+                      "changed": 0,
+                      "short_circuited": 0}
+
+    def _headers(self) -> dict:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def _handle_response(self, status, headers, body):
+        self.stats["requests"] += 1
+        if status == 304 and self.listing is not None:
+            self.stats["not_modified"] += 1
+            return self.listing, False
+        body_hash = hashlib.sha1(body).hexdigest()
+        if body_hash == self.body_hash and self.listing is not None:
+            self.stats["same_body"] += 1
+            return self.listing, False
+        self.stats["changed"] += 1
+        listing = Listing(json.loads(body))
+        self._pending = (headers.get("ETag", None), headers.get("Last-Modified", None), body_hash, listing)
+        return listing, True
+
+    def fetch(self, url):
+        """
+        returns the listing and whether it changed since the last committed fetch
+        """
+        response = get_session().get(url, headers=self._headers(), timeout=30)
+        return self._handle_response(response.status_code, response.headers, response.content)
+
+    async def fetch_async(self, session, url):
+        async with session.get(url, headers=self._headers()) as response:
+            body = await response.read()
+            return self._handle_response(response.status, response.headers, body)
+
+    def commit(self):
+        if self._pending is not None:
+            self.etag, self.last_modified, self.body_hash, self.listing = self._pending
+            self.listing.release()
+            self._pending = None
+
+    def short_circuit(self):
+        self.stats["short_circuited"] += 1
@@ -1,18 +1,66 @@
-import requests
-import json
+import os
+import time as clock
 from datetime import datetime, timezone
 import pytz
-import csv
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from mail_fetcher import get_limited_edition_id
-from apscheduler.schedulers.background import BackgroundScheduler, BlockingScheduler
+from fetcher import ListingFetcher, get_session
+from metadata_cache import MetadataCache
+from state_store import StateStore
+from alert_state import AlertState
+from adaptive_poller import AdaptivePoller, configure as configure_poller
+from sales_rate import SalesTracker
+from title_index import TitleIndex, ABBREVIATIONS_FILE
+from edition import Edition, start_date_timestamp
+from metrics import default_metrics as metrics, configure as configure_metrics
+from storage import default_storage as storage
+from plot_cache import default_cache as plot_cache
+from snapshot_diff import build_snapshot, diff_snapshots, BACK, SOLD_OUT, STOCK_CHANGED, EA_OVER, NEW_UPCOMING
 
 general_api_url = "https://sapi.displate.com/artworks/limited"
+# root for local_backup.json and the data directory, can be redirected e.g. for benchmarks
+BASE_DIR = Path(__file__).parent
 
 upcoming_le_id = None
 previous_number_of_upcoming_les = 0
 previous_active_displates = []
 
+listing_fetcher = ListingFetcher()
+# stock of the last processed listing, returned while the listing does not change
+last_stock = {}
+metadata_cache = MetadataCache()
+state_store = StateStore()
+alert_state = AlertState()
+poller = AdaptivePoller()
+sales_tracker = SalesTracker()
+title_index = TitleIndex()
+upcoming_start_dates = []
+# upper bound for manual requests running at the same time
+MAX_CONCURRENT_LOOKUPS = 8
+# source of the current epoch time, the replay replaces it with a simulated clock
+current_timestamp = clock.time
+# appends every api response to a log if set, see replay.py
+response_recorder = None
+
+
+def use_base_dir(base_dir):
+    # points the tracker at another directory with fresh in-memory state, e.g. for benchmarks and replays
+    global BASE_DIR, listing_fetcher, state_store, metadata_cache, alert_state, sales_tracker, title_index
+    global last_stock, upcoming_start_dates
+    import stock_history
+    BASE_DIR = Path(base_dir)
+    stock_history.DATA_DIR = BASE_DIR / "data"
+    listing_fetcher = ListingFetcher()
+    state_store = StateStore()
+    metadata_cache = MetadataCache()
+    alert_state = AlertState()
+    sales_tracker = SalesTracker()
+    title_index = TitleIndex()
+    last_stock = {}
+    upcoming_start_dates = []
+    storage.close()
+
 
 def check_weekday(weekday=2):
     # weekday 2 -> Wednesday, 3 -> Thursday
@@ -21,180 +69,324 @@ def check_weekday(weekday=2):
 
 
 def read_local_data() -> dict:
-    try:
-        with open(Path(__file__).parent / 'local_backup.json') as json_file:
-            data = json.load(json_file)
-    except FileNotFoundError as err:
-        data = {}
-    return data
+    return state_store.load(BASE_DIR / 'local_state.json', legacy_filepath=BASE_DIR / 'local_backup.json')
 
 
 def store_local_data(data):
-    with open(Path(__file__).parent / 'local_backup.json', 'w+') as outfile:
-        json.dump(data, outfile, indent=4)
+    state_store.save(BASE_DIR / 'local_state.json', data)
 
 
 def get_cet_time():
-    utc_dt = datetime.now(timezone.utc)
+    utc_dt = datetime.fromtimestamp(current_timestamp(), timezone.utc)
     CET = pytz.timezone('CET')
     return utc_dt.astimezone(CET)
 
 
 def store_metadata(data):
-    filepath = Path(Path(__file__).parent, f"data/{data['title']}/metadata.json")
-    if not filepath.exists():
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        from copy import deepcopy
-        temp_data = deepcopy(data)
-        with open(filepath, 'w+') as file:
-            temp_data["edition"].pop("status", None)
-            temp_data["edition"].pop("available", None)
-            json.dump(temp_data, file, indent=4)
+    filepath = Path(BASE_DIR, f"data/{data['title']}/metadata.json")
+    if not storage.exists(filepath):
+        get_title_index().add_title(data['title'])
+        # the stock fields change every cycle, only the edition is copied to leave them out
+        edition = {key: value for key, value in data["edition"].items() if key not in ("status", "available")}
+        storage.write_json(filepath, {**data, "edition": edition}, indent=4)
 
 
 def store_stock_change(id, time: datetime, stock):
-    filepath = Path(Path(__file__).parent, f"data/{id}/stockchanges.csv")
-    if not filepath.exists():
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, 'w+') as file:
-            writer = csv.writer(file)
-            writer.writerow(["datetime", "available_stock"])
-            writer.writerow([time.timestamp(), stock])
-    else:
-        with open(filepath, 'a+') as file:
-            writer = csv.writer(file)
-            writer.writerow([time.timestamp(), stock])
+    directory = Path(BASE_DIR, f"data/{id}")
+    with metrics.span("write_history"):
+        storage.append_history(directory, time.timestamp(), stock)
+    get_sales_tracker().record(id, time.timestamp(), stock)
+    plot_cache.invalidate(id)
 
 
 def manually_check_displate(id):
-    return requests.get(f"{general_api_url}/{id}").json()
+    with metrics.span("manual_check"):
+        return get_session().get(f"{general_api_url}/{id}", timeout=30).json()
 
 
-def create_new_directory(title):
-    filepath = Path(Path(__file__).parent, f"data/{title}/")
-    if not filepath.exists():
-        filepath.mkdir(parents=True, exist_ok=True)
+def fetch_lookups(ids) -> dict:
+    if len(ids) <= 1:
+        lookups = {le_id: manually_check_displate(le_id) for le_id in ids}
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(ids), MAX_CONCURRENT_LOOKUPS)) as pool:
+            lookups = dict(zip(ids, pool.map(manually_check_displate, ids)))
+    record_lookups(lookups)
+    return lookups
 
 
-def main():
-    output = {"stock": {},
-              "alert": {"ea_over": {},
-                        "back": {},
-                        "sold_out": {},
-                        "stock_level": {}},
-              "next_upcoming_LE": {}}
+def record_listing(listing, changed):
+    if response_recorder is not None:
+        response_recorder.record("listing", listing.response if changed else None, current_timestamp())
+
+
+def record_lookups(lookups):
+    if response_recorder is not None:
+        for le_id, response in lookups.items():
+            response_recorder.record("lookup", response, current_timestamp(), le_id=le_id)
+
+
+def enable_recording(filepath=None):
+    # filepath defaults to the environment variable DISPLATE_RECORD_FILE, nothing is recorded without one
+    global response_recorder
+    filepath = filepath or os.environ.get("DISPLATE_RECORD_FILE", None)
+    if filepath:
+        from replay import ResponseRecorder
+        response_recorder = ResponseRecorder(filepath)
+        print(f"recording api responses to {filepath}")
+
+
+def get_metadata_cache() -> MetadataCache:
+    metadata_cache.load(BASE_DIR / 'metadata_cache.json')
+    return metadata_cache
+
+
+def get_sales_tracker() -> SalesTracker:
+    # seeded from the stored histories on first use, afterwards every stock change updates it
+    if not sales_tracker.seeded:
+        with metrics.span("seed_sales"):
+            sales_tracker.seed(BASE_DIR / "data")
+    return sales_tracker
+
+
+def add_estimates(output, time: datetime):
+    tracker = get_sales_tracker()
+    output["eta"] = {title: tracker.estimate(title, time.timestamp()) for title in output["stock"]}
+
+
+def warm_up() -> list:
+    """
+    loads the caches used by the first cycle and the bot commands, returns the titles of the active editions
+    """
+    get_metadata_cache()
+    get_alert_state().general_config()
+    get_sales_tracker()
+    get_title_index()
+    return [edition.title for edition in read_local_data().get("previous_active_displates", [])]
+
+
+def get_title(le_id):
+    title = get_metadata_cache().get_title(le_id)
+    if title is None:
+        title = manually_check_displate(id=le_id)["data"]["title"]
+    return title
+
 
+def create_new_directory(title):
+    filepath = Path(BASE_DIR, f"data/{title}/")
+    if not storage.exists(filepath):
+        storage.ensure_dir(filepath)
+        get_title_index().add_title(title)
+
+
+def get_pending_lookups(listing, local_data, is_wednesday) -> list:
+    # ids that need a manual request during this cycle: the early access displate for its stock
+    # and sold out displates, but only if their title is neither known from the last cycle nor cached
+    active_ids = {edition.le_id for edition in listing.active}
+    previous_titles = {e.le_id: e.title for e in local_data.get("previous_active_displates", [])}
+    previous_le_ids = list(previous_titles)
+    cache = get_metadata_cache()
+    pending = [le_id for le_id in previous_le_ids
+               if le_id not in active_ids and previous_titles[le_id] is None and cache.get(le_id) is None]
+    upcoming_le_id = local_data.get("upcoming_le_id", None)
+    if upcoming_le_id is not None and upcoming_le_id not in pending:
+        ea_over = upcoming_le_id in active_ids and upcoming_le_id not in previous_le_ids
+        manual_fetch_required = (local_data.get("upcoming_le_status", "upcoming") == "upcoming"
+                                 and upcoming_le_id not in active_ids)
+        if not ea_over and (is_wednesday or manual_fetch_required):
+            pending.append(upcoming_le_id)
+    return pending
+
+
+def format_alert_message(alerts) -> str:
+    message = ""
+    for title in alerts.get("ea_over", {}):
+        message += f"Early Access Phase of **{title}** is over, remaining stock: {alerts['ea_over'][title]}\n"
+    for title in alerts.get("back", {}):
+        message += f"**{title}** is available again, with a stock of {alerts['back'][title]}\n"
+    for title in alerts.get("sold_out", {}):
+        message += f"**{title}** sold out!\n"
+    for title in alerts.get("stock_level", {}):
+        message += f"Stock of **{title}** went below {alerts['stock_level'][title]}, grab it while you can!\n"
+    return message
+
+
+def new_output() -> dict:
+    return {"stock": {},
+            "alert": {"ea_over": {},
+                      "back": {},
+                      "sold_out": {},
+                      "stock_level": {}},
+            "next_upcoming_LE": {},
+            "eta": {},
+            "changes": 0}
+
+
+def prepare_cycle():
     local_data = read_local_data()
+    get_sales_tracker()
     is_wednesday, time = check_weekday(2)
-    manual_fetch_required = False
     if local_data.get("upcoming_le_id", None) is None and is_wednesday:
         local_data["upcoming_le_id"] = get_limited_edition_id()
+        if response_recorder is not None:
+            response_recorder.record("upcoming", {"id": local_data["upcoming_le_id"]}, current_timestamp())
     elif not is_wednesday:
         pass
         # local_data.pop('upcoming_le_stock', None)
         # local_data["upcoming_le_id"] = None
-    try:
-        response = requests.get(general_api_url)
-        out = response.json()
-
-        active_displates = [d for d in out["data"] if d['edition']['status'] == 'active']
-        upcoming_displates = [d for d in out["data"] if d['edition']['status'] == 'upcoming']
-
-        if local_data.get("upcoming_le_id", None) is not None:
-            if local_data.get("upcoming_le_status", "upcoming") == "upcoming":
-                all_active_ids = [d["itemCollectionId"] for d in active_displates]
-                if local_data.get("upcoming_le_id", None) not in all_active_ids:
-                    manual_fetch_required = True
-
-        # if not len(local_data.get("previous_active_displates", [])) == 0:
-
-        previous_le_ids = [d["itemCollectionId"] for d in local_data.get("previous_active_displates", [])]
-        processed_le_ids = []
-        for displate in active_displates:
-            current_stock = displate['edition']['available']
-            store_metadata(data=displate)
-            output["stock"][displate["title"]] = current_stock
-            if displate["itemCollectionId"] not in previous_le_ids:
-                if displate["itemCollectionId"] == local_data.get("upcoming_le_id", None):
-                    # if check_weekday(3):
-                    print("Early Access Phase over!")
-                    output["alert"]["ea_over"][displate["title"]] = current_stock
-                    local_data["upcoming_le_id"] = None
-                    local_data["upcoming_le_stock"] = None
-                    local_data["upcoming_le_status"] = None
-                else:
-                    print(f"Limited Edition '{displate['title']}' is available again!")
-                    output["alert"]["back"][displate["title"]] = current_stock
-                store_stock_change(id=displate["title"],
-                                   time=get_cet_time(),
-                                   stock=current_stock)
+    return local_data, is_wednesday, time
+
+
+def process_listing(listing, lookups, local_data, is_wednesday, output):
+    """
+    Runs the diff between the stored and the fetched listing, writes all stock changes and the local backup.
+    lookups maps every id returned by get_pending_lookups to its manually fetched response
+    """
+    manual_fetch_required = False
+    active_editions, upcoming_editions = listing.active, listing.upcoming
+
+    if local_data.get("upcoming_le_id", None) is not None:
+        if local_data.get("upcoming_le_status", "upcoming") == "upcoming":
+            all_active_ids = [e.le_id for e in active_editions]
+            if local_data.get("upcoming_le_id", None) not in all_active_ids:
+                manual_fetch_required = True
+
+    with metrics.span("diff"):
+        previous_active = build_snapshot(local_data.get("previous_active_displates", []))
+        events = diff_snapshots(previous_active=previous_active,
+                                current_active=build_snapshot(active_editions),
+                                previous_upcoming=build_snapshot(local_data.get("previous_upcoming_displates", [])),
+                                current_upcoming=build_snapshot(upcoming_editions),
+                                upcoming_le_id=local_data.get("upcoming_le_id", None))
+    output["changes"] = len(events)
+    global upcoming_start_dates
+    upcoming_start_dates = [start_date_timestamp(e.start_date) for e in upcoming_editions if e.start_date]
+    cache = get_metadata_cache()
+    cache.update(Edition.from_api(lookup["data"]) for lookup in lookups.values())
+    with metrics.span("write_metadata"):
+        # metadata.json of a new title keeps the whole response, everything else only uses the editions.
+        # An unchanged listing was released after the cycle that processed it and wrote its metadata
+        if listing.response is not None:
+            for displate in listing.response["data"]:
+                if displate['edition']['status'] == 'active':
+                    store_metadata(data=displate)
+    for edition in active_editions:
+        output["stock"][edition.title] = edition.available
+    for event in events:
+        metrics.incr("events_total", kind=event.kind)
+        if event.kind == EA_OVER:
+            print("Early Access Phase over!")
+            output["alert"]["ea_over"][event.title] = event.stock
+            local_data["upcoming_le_id"] = None
+            local_data["upcoming_le_stock"] = None
+            local_data["upcoming_le_status"] = None
+            store_stock_change(id=event.title, time=get_cet_time(), stock=event.stock)
+        elif event.kind == BACK:
+            print(f"Limited Edition '{event.title}' is available again!")
+            output["alert"]["back"][event.title] = event.stock
+            store_stock_change(id=event.title, time=get_cet_time(), stock=event.stock)
+        elif event.kind == STOCK_CHANGED:
+            print(f"Available stock for '{event.title}' changed to {event.stock} from {event.previous_stock}")
+            store_stock_change(id=event.title, time=get_cet_time(), stock=event.stock)
+            if event.stock < 100:
+                alert_sent = check_alert(title=event.title, stocklevel=100)
+                if not alert_sent:
+                    output["alert"]["stock_level"][event.title] = 100
+                    save_alert(title=event.title, stocklevel=100)
+        elif event.kind == SOLD_OUT:
+            if event.le_id in lookups:
+                title = lookups[event.le_id]["data"]["title"]
             else:
-                index = previous_le_ids.index(displate["itemCollectionId"])
-                prev_stock = local_data["previous_active_displates"][index]["edition"]["available"]
-                if current_stock != prev_stock:
-                    print(f"Available stock for '{displate['title']}' changed to {current_stock} from {prev_stock}")
-                    store_stock_change(id=displate["title"],
-                                       time=get_cet_time(),
-                                       stock=current_stock)
-                    if current_stock < 100:
-                        alert_sent = check_alert(title=displate["title"], stocklevel=100)
-                        if not alert_sent:
-                            output["alert"]["stock_level"][displate["title"]] = 100
-                            save_alert(title=displate["title"], stocklevel=100)
-                # # even if the stock was not updated, remove the displate from the previous list,
-                # # so that only sold_out displates remain
-                # previous_le_ids.remove(displate["itemCollectionId"])
-            processed_le_ids.append(displate["itemCollectionId"])
-        for previous_le in previous_le_ids:
-            if previous_le not in processed_le_ids:
-                title = manually_check_displate(previous_le)["data"]["title"]
-                store_stock_change(id=title,
+                title = event.title or cache.get_title(event.le_id)
+            store_stock_change(id=title, time=get_cet_time(), stock=0)
+            print(f"Limited Edition '{title}' sold out!")
+            output["alert"]["sold_out"][title] = 0
+        elif event.kind == NEW_UPCOMING:
+            print(f"Next upcoming Limited edition: {event.title}")
+            output["next_upcoming_LE"] = {"title": event.title,
+                                          "startDate": event.edition.start_date,
+                                          "image": event.edition.image}
+            create_new_directory(event.title)
+    if is_wednesday or manual_fetch_required:
+        if not local_data.get("upcoming_le_id", None) is None:
+            ea_le = lookups[local_data["upcoming_le_id"]]["data"]
+            store_metadata(data=ea_le)
+            stock = ea_le["edition"]["available"]
+            local_data["upcoming_le_status"] = ea_le["edition"]["status"]
+            was_sold_out = local_data.get("upcoming_le_stock", ea_le["edition"]["size"]) == 0
+            is_sold_out = stock == 0
+            if not is_sold_out:
+                output["stock"][ea_le["title"]] = stock
+            if not was_sold_out and is_sold_out:
+                print(f"Limited Edition '{ea_le['title']}' sold out!")
+                output["alert"]["sold_out"][ea_le["title"]] = stock
+                local_data["upcoming_le_stock"] = ea_le["edition"]["available"]
+            if was_sold_out and not is_sold_out:
+                print(f"Limited Edition '{ea_le['title']}' is available again!")
+                output["alert"]["back"][ea_le["title"]] = stock
+            if stock != local_data.get("upcoming_le_stock", ea_le["edition"]["size"]):
+                print(f"Available stock for '{ea_le['title']}' changed to {stock}")
+                store_stock_change(id=ea_le["title"],
                                    time=get_cet_time(),
-                                   stock=0)
-                print(f"Limited Edition '{title}' sold out!")
-                output["alert"]["sold_out"][title] = 0
-        # END OF# if not len(local_data.get("previous_active_displates", [])) == 0:
-        if is_wednesday or manual_fetch_required:
-            if not local_data.get("upcoming_le_id", None) is None:
-                ea_le = manually_check_displate(local_data["upcoming_le_id"])["data"]
-                store_metadata(data=ea_le)
-                stock = ea_le["edition"]["available"]
-                local_data["upcoming_le_status"] = ea_le["edition"]["status"]
-                was_sold_out = local_data.get("upcoming_le_stock", ea_le["edition"]["size"]) == 0
-                is_sold_out = stock == 0
-                if not is_sold_out:
-                    output["stock"][ea_le["title"]] = stock
-                if not was_sold_out and is_sold_out:
-                    print(f"Limited Edition '{ea_le['title']}' sold out!")
-                    output["alert"]["sold_out"][ea_le["title"]] = stock
-                    local_data["upcoming_le_stock"] = ea_le["edition"]["available"]
-                if was_sold_out and not is_sold_out:
-                    print(f"Limited Edition '{ea_le['title']}' is available again!")
-                    output["alert"]["back"][ea_le["title"]] = stock
-                if stock != local_data.get("upcoming_le_stock", ea_le["edition"]["size"]):
-                    print(f"Available stock for '{ea_le['title']}' changed to {stock}")
-                    store_stock_change(id=ea_le["title"],
-                                       time=get_cet_time(),
-                                       stock=stock)
-                    local_data["upcoming_le_stock"] = ea_le["edition"]["available"]
-                # if local_data.get("upcoming_le_status", "available") != ea_le["edition"]["available"]:
-                #     local_data["upcoming_le_status"] = ea_le["edition"]["status"]
-        local_data["previous_active_displates"] = active_displates
-        if not len(local_data.get("previous_upcoming_displates", [])) == 0:
-            previous_le_names = [d["title"] for d in local_data.get("previous_upcoming_displates", [])]
-            for displate in upcoming_displates:
-                title = displate["title"]
-                if title not in previous_le_names:
-                    print(f"Next upcoming Limited edition: {title}")
-                    output["next_upcoming_LE"] = {"title": title,
-                                                  "startDate": displate["edition"]["startDate"],
-                                                  "image": displate["images"]["main"]["url"]}
-                    create_new_directory(title)
-        local_data["previous_upcoming_displates"] = upcoming_displates
+                                   stock=stock)
+                local_data["upcoming_le_stock"] = ea_le["edition"]["available"]
+            # if local_data.get("upcoming_le_status", "available") != ea_le["edition"]["available"]:
+            #     local_data["upcoming_le_status"] = ea_le["edition"]["status"]
+    with metrics.span("flush_history"):
+        storage.flush()
+    local_data["previous_active_displates"] = active_editions
+    local_data["previous_upcoming_displates"] = upcoming_editions
+    with metrics.span("write_state"):
         store_local_data(data=local_data)
-    except Exception as error:
-        print(f"{time=}")
-        print(error)
+    cache.update(active_editions)
+    cache.update(upcoming_editions)
+    with metrics.span("write_metadata_cache"):
+        cache.save(BASE_DIR / 'metadata_cache.json')
+    with metrics.span("write_alerts"):
+        get_alert_state().flush()
+    return output
+
+
+def try_short_circuit(changed, pending, output) -> bool:
+    # nothing to diff or write if the listing did not change and no manual request is due
+    if changed or len(pending) != 0:
+        return False
+    listing_fetcher.short_circuit()
+    output["stock"] = dict(last_stock)
+    return True
+
+
+def observe_cycle(output, is_wednesday):
+    poller.observe(changes=output["changes"], start_dates=upcoming_start_dates, early_access=is_wednesday)
+
+
+def finish_cycle(output):
+    global last_stock
+    listing_fetcher.commit()
+    last_stock = dict(output["stock"])
+
+
+def main():
+    output = new_output()
+    with metrics.span("cycle"):
+        with metrics.span("prepare"):
+            local_data, is_wednesday, time = prepare_cycle()
+        try:
+            with metrics.span("fetch_listing"):
+                listing, changed = listing_fetcher.fetch(general_api_url)
+            record_listing(listing, changed)
+            pending = get_pending_lookups(listing, local_data, is_wednesday)
+            if not try_short_circuit(changed, pending, output):
+                with metrics.span("lookups"):
+                    lookups = fetch_lookups(pending)
+                with metrics.span("process"):
+                    process_listing(listing, lookups, local_data, is_wednesday, output)
+                finish_cycle(output)
+            add_estimates(output, time)
+            observe_cycle(output, is_wednesday)
+        except Exception as error:
+            metrics.incr("errors_total", where="cycle", error=type(error).__name__)
+            print(f"{time=}")
+            print(f"{type(error).__name__}: {error}")
     return output, time
 
     # print(json.dumps(active_displates, indent=4))
@@ -202,62 +394,68 @@ def main():
     # print(json.dumps(upcoming_displates, indent=4))
 
 
+def get_title_index() -> TitleIndex:
+    # built from the data directory on first use, kept up to date by store_metadata, create_new_directory
+    # and add_abbreviations
+    title_index.set_data_dir(BASE_DIR / "data")
+    return title_index
+
+
 def get_abbreviations():
-    filepath = Path(Path(__file__).parent, f"data/abbreviations.csv")
-    if not filepath.exists():
-        return {}
-    else:
-        with open(filepath) as json_file:
-            data = json.load(json_file)
-        return data
+    return dict(get_title_index().abbreviations)
 
 
 def add_abbreviations(abbreviation, title):
-    abbreviations = get_abbreviations()
+    index = get_title_index()
     # check if title is valid:
-    if Path(Path(__file__).parent, f"data/{title}/").exists():
+    title = index.get_title(title)
+    if title is not None:
+        abbreviations = get_abbreviations()
         abbreviations[abbreviation.lower()] = title
-        filepath = Path(Path(__file__).parent, f"data/abbreviations.csv")
-        if not filepath.exists():
-            filepath.parent.mkdir(parents=True, exist_ok=True)
-        with open(filepath, "w+") as json_file:
-            json.dump(abbreviations, json_file, indent=4)
+        storage.write_json(Path(BASE_DIR, f"data/{ABBREVIATIONS_FILE}"), abbreviations, indent=4)
+        index.set_abbreviation(abbreviation, title)
         return True
     else:
         return False
 
 
+def get_alert_state() -> AlertState:
+    alert_state.set_data_dir(BASE_DIR / "data")
+    return alert_state
+
+
 def check_alert(title, stocklevel):
-    data = read_alert(title)
-    return data.get(str(stocklevel), False) is True
+    return get_alert_state().check(title, stocklevel)
 
 
 def read_alert(title):
-    try:
-        with open(Path(__file__).parent / f"data/{title}/alerts.json") as json_file:
-            data = json.load(json_file)
-    except Exception as err:
-        print("Error in read_alert:", err)
-        data = {}
-    return data
+    return dict(get_alert_state().read_alert(title))
 
 
 def save_alert(title, stocklevel):
-    data = read_alert(title=title)
-    data[str(stocklevel)] = True
-    filepath = Path(__file__).parent / f"data/{title}/alerts.json"
-    if not filepath.exists():
-        filepath.parent.mkdir(parents=True, exist_ok=True)
-    with open(filepath, 'w+') as json_file:
-        json.dump(data, json_file, indent=4)
+    # written with the next flush at the end of the cycle
+    get_alert_state().mark(title, stocklevel)
 
 
 if __name__ == '__main__':
+    # only needed when the tracker runs on its own, the bot schedules the cycles itself
+    from apscheduler.schedulers.background import BackgroundScheduler, BlockingScheduler
     # scheduler = BackgroundScheduler()
 
     scheduler = BlockingScheduler()
-    job = scheduler.add_job(main, 'interval', minutes=1)
-    main()
+    configure_metrics(metrics)
+    configure_poller(poller)
+    enable_recording()
+
+    def run_and_reschedule():
+        output, _ = main()
+        interval = poller.next_interval()
+        job.reschedule('interval', seconds=interval)
+        metrics.end_cycle(changes=output["changes"], next_interval=round(interval, 1))
+        print(f"next poll in {interval:.0f}s, {poller.stats}")
+
+    job = scheduler.add_job(run_and_reschedule, 'interval', minutes=1)
+    run_and_reschedule()
     scheduler.start()
 
     # print(main())
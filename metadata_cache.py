@@ -0,0 +1,61 @@
+import json
+
+from storage import default_storage
+
+
+def extract_metadata(edition) -> dict:
+    return {"title": edition.title,
+            "size": edition.size,
+            "startDate": edition.start_date,
+            "image": edition.image}
+
+
+class MetadataCache:
+    """
+    Maps itemCollectionId to the static metadata of a limited edition (title, size, startDate, image),
+    so sold out editions can be resolved without requesting them from the api again
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.dirty = False
+        self.loaded_from = None
+
+    def load(self, filepath):
+        if self.loaded_from == filepath:
+            return
+        try:
+            with open(filepath) as json_file:
+                self.entries = json.load(json_file)
+        except FileNotFoundError:
+            self.entries = {}
+        except json.JSONDecodeError as err:
+            # the cache is rebuilt from the following listings and lookups
+            print(f"Error in MetadataCache.load: {err}, starting with an empty cache")
+            self.entries = {}
+        self.loaded_from = filepath
+        self.dirty = False
+
+    def get(self, le_id):
+        # json only allows string keys
+        return self.entries.get(str(le_id), None)
+
+    def get_title(self, le_id):
+        entry = self.get(le_id)
+        return entry["title"] if entry is not None else None
+
+    def update(self, editions):
+        for edition in editions:
+            metadata = extract_metadata(edition)
+            key = str(edition.le_id)
+            if self.entries.get(key, None) != metadata:
+                self.entries[key] = metadata
+                self.dirty = True
+
+    def save(self, filepath):
+        if not self.dirty:
+            return
+        # written atomically, a crash must not leave a truncated cache behind
+        default_storage.atomic_write(filepath, json.dumps(self.entries, separators=(",", ":")))
+        self.loaded_from = filepath
+        self.dirty = False
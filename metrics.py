@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+PREFIX = "displate"
+
+
+def _key(name, labels) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def _format_labels(labels) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Timing spans and counters of the tracking cycle and the bot. A span is two clock reads and one dict update,
+    cheap enough to stay enabled in production. Totals since the start are served as Prometheus text,
+    the spans and counter increases of every cycle can be appended to a rotating JSONL file
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        # (name, labels) -> value
+        self.counters = {}
+        # span name -> [count, total seconds, max seconds]
+        self.spans = {}
+        self.cycle_spans = {}
+        self.cycle_counters = {}
+        self.exporter = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            span = self.spans.get(name, None)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+            self.cycle_spans[name] = self.cycle_spans.get(name, 0.0) + seconds
+
+    def incr(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.cycle_counters[key] = self.cycle_counters.get(key, 0) + value
+
+    def end_cycle(self, **fields) -> dict:
+        """
+        returns the spans and counter increases since the last call and appends them to the JSONL file, if set
+        """
+        with self._lock:
+            record = {"time": time.time(),
+                      "spans": {name: round(seconds, 6) for name, seconds in self.cycle_spans.items()},
+                      "counters": {name + _format_labels(labels): value
+                                   for (name, labels), value in self.cycle_counters.items()}}
+            self.cycle_spans = {}
+            self.cycle_counters = {}
+        record.update(fields)
+        if self.exporter is not None:
+            try:
+                self.exporter.write(record)
+            except OSError as error:
+                print("Error while writing metrics:", error)
+        return record
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            counters = sorted(self.counters.items())
+            spans = sorted((name, list(values)) for name, values in self.spans.items())
+        lines = []
+        for index, ((name, labels), value) in enumerate(counters):
+            if index == 0 or counters[index - 1][0][0] != name:
+                lines.append(f"# TYPE {PREFIX}_{name} counter")
+            lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {value}")
+        if len(spans) != 0:
+            lines.append(f"# TYPE {PREFIX}_span_seconds summary")
+        for name, (count, total, maximum) in spans:
+            lines.append(f'{PREFIX}_span_seconds_count{{span="{name}"}} {count}')
+            lines.append(f'{PREFIX}_span_seconds_sum{{span="{name}"}} {total:.6f}')
+            lines.append(f'{PREFIX}_span_seconds_max{{span="{name}"}} {maximum:.6f}')
+        return "\n".join(lines) + "\n"
+
+
+class JsonlExporter:
+    """
+    Appends one JSON object per line, the file is rotated to .1, .2, ... once it is larger than max_bytes
+    """
+
+    def __init__(self, filepath, max_bytes=10 * 1024 * 1024, backups=3):
+        self.filepath = Path(filepath)
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+    def rotate(self):
+        for index in range(self.backups - 1, 0, -1):
+            source = self.filepath.with_name(f"{self.filepath.name}.{index}")
+            if source.exists():
+                os.replace(source, self.filepath.with_name(f"{self.filepath.name}.{index + 1}"))
+        if self.backups > 0:
+            os.replace(self.filepath, self.filepath.with_name(f"{self.filepath.name}.1"))
+        else:
+            self.filepath.unlink()
+
+    def write(self, record):
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        if self.filepath.exists() and self.filepath.stat().st_size >= self.max_bytes:
+            self.rotate()
+        with open(self.filepath, 'a') as file:
+            file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def start_http_server(metrics, port, host="127.0.0.1"):
+    # serves the Prometheus text on every path from a daemon thread
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def configure(metrics, jsonl_file=None, port=None):
+    """
+    enables the exports, the arguments default to the environment variables
+    DISPLATE_METRICS_FILE and DISPLATE_METRICS_PORT
+    """
+    jsonl_file = jsonl_file or os.environ.get("DISPLATE_METRICS_FILE", None)
+    port = port or os.environ.get("DISPLATE_METRICS_PORT", None)
+    if jsonl_file:
+        metrics.exporter = JsonlExporter(jsonl_file)
+    if port:
+        start_http_server(metrics, int(port))
+        print(f"metrics are served on http://127.0.0.1:{port}/metrics")
+
+
+default_metrics = Metrics()
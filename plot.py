@@ -1,17 +1,37 @@
 import csv
 import datetime
-import json
 import io
+import os
+import threading
+import time as clock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from pathlib import Path
 import sys
 
+import stock_history
+from stock_history import find_history_file, is_binary, read_binary, load_history, parse_csv_rows
+from plot_cache import default_cache, history_key, compare_key
+from storage import default_storage
+import numpy as np
+
+# matplotlib date number of the unix epoch, date numbers count days
+EPOCH_DATE_NUMBER = mdates.date2num(datetime.datetime(1970, 1, 1))
+# upper bound of points handed to matplotlib for images posted to discord, a few per horizontal pixel
+MAX_RENDER_POINTS = 4000
+# lower bound of points per title in comparisons, MAX_RENDER_POINTS is shared between all titles above it
+MIN_COMPARE_POINTS = 1000
+# histories loaded at the same time for a comparison
+MAX_LOADING_THREADS = 8
 
-# import numpy as np
 
 def process_file(filepath):
+    if is_binary(filepath):
+        times, stocks = read_binary(filepath)
+        return [datetime.datetime.fromtimestamp(timestamp) for timestamp in times.tolist()], stocks.tolist()
     data = {}
     with open(filepath) as csv_file:
         csv_reader = csv.reader(csv_file, delimiter=',')
@@ -27,35 +47,150 @@ def process_file(filepath):
     return data["time"], data["stock"]
 
 
+class HistoryArrays:
+    """
+    Parsed histories of the files loaded by this process, least recently used ones are dropped.
+    csv histories are append-only, so a file that grew is only parsed from the end of the last read
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        # filepath -> (inode, parsed bytes, times, stock)
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "appends": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def load(self, filepath):
+        filepath = Path(filepath)
+        if is_binary(filepath):
+            return load_history(filepath)
+        stat = os.stat(filepath)
+        with self._lock:
+            entry = self.entries.get(filepath, None)
+        if entry is not None and entry[0] == stat.st_ino and entry[1] == stat.st_size:
+            self.stats["hits"] += 1
+            inode, offset, times, stock = entry
+        else:
+            if entry is None or entry[0] != stat.st_ino or entry[1] > stat.st_size:
+                self.stats["misses"] += 1
+                entry = (stat.st_ino, 0, np.zeros(0), np.zeros(0, dtype=np.int64))
+            else:
+                self.stats["appends"] += 1
+            inode, offset, times, stock = entry
+            with open(filepath, 'rb') as file:
+                if offset == 0:
+                    file.readline()
+                else:
+                    file.seek(offset)
+                start = file.tell()
+                raw = file.read()
+            # a row that is still being written is parsed with the next load
+            end = raw.rfind(b"\n") + 1
+            new_times, new_stock = parse_csv_rows(raw[:end])
+            offset = start + end
+            times, stock = np.concatenate([times, new_times]), np.concatenate([stock, new_stock])
+        with self._lock:
+            self.entries[filepath] = (inode, offset, times, stock)
+            self.entries.move_to_end(filepath)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        # callers may modify the arrays
+        return times.copy(), stock.copy()
+
+
+history_arrays = HistoryArrays()
+
+
+def local_utc_offsets(times):
+    # the utc offset only changes at full hours, so it is looked up once per distinct hour instead of per row
+    if len(times) == 0:
+        return np.zeros(0)
+    hours, inverse = np.unique(np.floor_divide(times, 3600).astype(np.int64), return_inverse=True)
+    offsets = np.array([clock.localtime(hour * 3600).tm_gmtoff for hour in hours.tolist()], dtype=np.float64)
+    return offsets[inverse]
+
+
+def to_date_numbers(times):
+    # same local, naive times as datetime.fromtimestamp, but as matplotlib date numbers
+    return (times + local_utc_offsets(times)) / 86400.0 + EPOCH_DATE_NUMBER
+
+
+def crop_arrays(times, stock):
+    sold_out = np.flatnonzero(stock == 0)
+    if len(sold_out) == 0:
+        print("Unable to find stock value of 0.")
+        return times, stock
+    # include the first sold out entry
+    return times[:sold_out[0] + 1], stock[:sold_out[0] + 1]
+
+
+def rebase_date_numbers(date_numbers, start_date, base=datetime.datetime(2022, 1, 2)):
+    return date_numbers + (mdates.date2num(base) - mdates.date2num(start_date))
+
+
+def downsample_steps(times, stock, max_points=MAX_RENDER_POINTS):
+    """
+    Reduces a history to at most max_points by splitting the time range into max_points / 4 buckets
+    and keeping the first, last, minimum and maximum entry of every bucket (M4 downsampling).
+    Every change between buckets and every extreme within a bucket is kept,
+    so the rendered curve looks the same at image resolution. The first sold out entry is always kept
+    """
+    count = len(times)
+    if max_points is None or count <= max_points or max_points < 4:
+        return times, stock
+    buckets = max_points // 4
+    edges = np.linspace(times[0], times[-1], buckets + 1)
+    bucket_ids = np.clip(np.searchsorted(edges, times, side="right") - 1, 0, buckets - 1)
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+    ends = np.r_[starts[1:] - 1, count - 1]
+    # sorted by bucket and then by stock, the first entry of a bucket is its minimum and the last its maximum
+    by_stock = np.lexsort((stock, bucket_ids))
+    keep = [starts, ends, by_stock[starts], by_stock[ends], np.flatnonzero(stock == 0)[:1]]
+    keep = np.unique(np.concatenate(keep))
+    return times[keep], stock[keep]
+
+
 def get_metdata(name):
-    filepath = Path(__file__).parent / f"data/{name}/metadata.json"
-    if filepath.exists():
-        with open(filepath) as json_file:
-            data = json.load(json_file)
-    else:
+    data = default_storage.read_json(stock_history.DATA_DIR / f"{name}/metadata.json")
+    if data is None:
         data = {}
         print("No data available")
     return data
 
 
 def get_name_from_abbreviation(title):
-    from main import get_abbreviations
-    return get_abbreviations().get(title.lower(), None)
+    from main import get_title_index
+    return get_title_index().resolve(title)
+
+
+def get_history_file(name):
+    # the render workers only get full titles and never load the title index
+    filepath, title = find_history_file(name)
+    if not default_storage.exists(filepath):
+        title = get_name_from_abbreviation(title=name)
+        if title is not None:
+            return find_history_file(title)
+    return filepath, name
 
 
 def plot_stock_history(name=None,
                        id=None, use_markers=False,
                        first_sold_out_only=True,
-                       style="seaborn-dark", use_file=False, print_to_console=True):
+                       style="seaborn-dark", use_file=False, print_to_console=True, use_cache=True,
+                       downsample=True):
     assert name is None or id is None
     if name is None:
-        from main import manually_check_displate
-        name = manually_check_displate(id=id)["data"]["title"]
-    filepath = Path(Path(__file__).parent, f"data/{name}/stockchanges.csv")
-    if not filepath.exists():
-        name = get_name_from_abbreviation(title=name)
-        filepath = Path(Path(__file__).parent, f"data/{name}/stockchanges.csv")
-    time, stock = process_file(filepath=filepath)
+        from main import get_title
+        name = get_title(id)
+    filepath, name = get_history_file(name)
+    cache_key = None
+    if not use_file and use_cache:
+        cache_key = history_key(name, style, use_markers=use_markers, first_sold_out_only=first_sold_out_only,
+                                downsample=downsample)
+        png = default_cache.get(cache_key)
+        if png is not None:
+            return io.BytesIO(png)
+    time, stock = load_history(filepath=filepath)
     # fig, ax = plt.subplots()
 
     if style == "dracula":
@@ -72,7 +207,11 @@ def plot_stock_history(name=None,
     # time = data["time"]
     # stock = data["stock"]
     if first_sold_out_only:
-        time, stock = crop_data(time, stock)
+        time, stock = crop_arrays(time, stock)
+    if downsample and not use_file:
+        # full resolution for exported files
+        time, stock = downsample_steps(time, stock)
+    time = to_date_numbers(time)
 
     locator = mdates.AutoDateLocator(minticks=4, maxticks=10)
     # locator.intervald["YEARLY"] = [0]
@@ -89,7 +228,7 @@ def plot_stock_history(name=None,
     # ax.set_xlim(lims[nn])
     ax.set_title(name)
     if print_to_console:
-        print(f"last timestamp: {time[-1]} \nlast stock value: {stock[-1]}")
+        print(f"last timestamp: {mdates.num2date(time[-1]).replace(tzinfo=None)} \nlast stock value: {stock[-1]}")
 
     if use_file:
         plt.savefig(Path(__file__).parent / f"{name}.png", dpi=300)
@@ -100,6 +239,8 @@ def plot_stock_history(name=None,
         plt.savefig(buf, format="png", dpi=300)
         buf.seek(0)
         plt.clf()
+        if cache_key is not None:
+            default_cache.put(cache_key, buf.getvalue())
         return buf
 
 
@@ -116,23 +257,41 @@ def crop_data(time, stock):
     return time, stock
 
 
-def plot_single_entry_to_compare(name, ax=None):
-    filepath = Path(Path(__file__).parent, f"data/{name}/stockchanges.csv")
-    if not filepath.exists():
-        name = get_name_from_abbreviation(title=name)
-        filepath = Path(Path(__file__).parent, f"data/{name}/stockchanges.csv")
-    time, stock = process_file(filepath=filepath)
+def load_compare_entry(name, max_points=None):
+    """
+    loads, crops and downsamples the history of one title, returns the title, its startDate and the arrays
+    """
+    filepath, name = get_history_file(name)
+    time, stock = history_arrays.load(filepath)
     metadata = get_metdata(name=name)
-    # fig, ax = plt.subplots()
-    if ax is None:
-        ax = plt.gca()
-    plt.grid(visible=True)
-
-    time, stock = crop_data(time, stock)
-    base = datetime.datetime(2022, 1, 2)
+    time, stock = crop_arrays(time, stock)
+    time, stock = downsample_steps(time, stock, max_points=max_points)
     start_date = datetime.datetime.strptime(metadata["edition"]["startDate"], '%Y-%m-%d %H:%M:%S')
-    time = [base + (timestamp - start_date) for timestamp in time]
+    return name, start_date, time, stock
+
 
+def load_compare_histories(names, max_points=None) -> list:
+    """
+    loads all histories in parallel and converts them to date numbers relative to their startDate in one pass,
+    returns (title, date numbers, stock) in the order of names
+    """
+    if len(names) <= 1:
+        entries = [load_compare_entry(name, max_points) for name in names]
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(names), MAX_LOADING_THREADS)) as pool:
+            entries = list(pool.map(lambda name: load_compare_entry(name, max_points), names))
+    if len(entries) == 0:
+        return []
+    lengths = [len(time) for _, _, time, _ in entries]
+    shifts = [mdates.date2num(datetime.datetime(2022, 1, 2)) - mdates.date2num(start_date)
+              for _, start_date, _, _ in entries]
+    date_numbers = to_date_numbers(np.concatenate([time for _, _, time, _ in entries]))
+    date_numbers += np.repeat(shifts, lengths)
+    splits = np.split(date_numbers, np.cumsum(lengths)[:-1])
+    return [(name, time, stock) for (name, _, _, stock), time in zip(entries, splits)]
+
+
+def set_compare_axis(ax):
     locator = mdates.AutoDateLocator(minticks=4, maxticks=10)
     formatter = mdates.ConciseDateFormatter(locator)
     formatter.formats = ['', '', '%d', '%H:%M', '%H:%M', '%S.%f']
@@ -143,15 +302,32 @@ def plot_single_entry_to_compare(name, ax=None):
     ax.xaxis.set_major_locator(locator)
     ax.xaxis.set_major_formatter(formatter)
 
+
+def plot_single_entry_to_compare(name, ax=None, max_points=None):
+    if ax is None:
+        ax = plt.gca()
+    plt.grid(visible=True)
+    [(name, time, stock)] = load_compare_histories([name], max_points=max_points)
+    set_compare_axis(ax)
     plot = ax.plot(time, stock, label=name)
 
     # ax.set_xlim(lims[nn])
     # ax.set_title(name)
-    print(f"last timestamp: {time[-1]} \nlast stock value: {stock[-1]}")
+    print(f"last timestamp: {mdates.num2date(time[-1]).replace(tzinfo=None)} \nlast stock value: {stock[-1]}")
     return plot, name
 
 
-def plot_compare(names, style="seaborn-dark", use_file=False):
+def compare_points(count) -> int:
+    return max(MAX_RENDER_POINTS // max(count, 1), MIN_COMPARE_POINTS)
+
+
+def plot_compare(names, style="seaborn-dark", use_file=False, use_cache=True, downsample=True):
+    cache_key = None
+    if not use_file and use_cache:
+        cache_key = compare_key(names, style, downsample=downsample)
+        png = default_cache.get(cache_key)
+        if png is not None:
+            return io.BytesIO(png)
     if style == "dracula":
         import matplotx
         plt.style.use(matplotx.styles.dracula)
@@ -159,24 +335,36 @@ def plot_compare(names, style="seaborn-dark", use_file=False):
         pass
     else:
         plt.style.use(style=style)
+    histories = load_compare_histories(names, max_points=compare_points(len(names))
+                                       if downsample and not use_file else None)
     fig, ax = plt.subplots()
+    if 10 < len(histories) <= 20:
+        # the default color cycle repeats after 10 colors
+        ax.set_prop_cycle(color=plt.get_cmap("tab20").colors)
+    elif len(histories) > 20:
+        ax.set_prop_cycle(color=plt.get_cmap("turbo")(np.linspace(0, 1, len(histories))))
+    set_compare_axis(ax)
     plots = []
     titles = []
-    for name in names:
-        plot, title = plot_single_entry_to_compare(name=name, ax=ax)
-        plots.append(plot[0])
-        titles.append(title)
-    ax.legend(plots, titles)
+    for name, time, stock in histories:
+        plots.append(ax.plot(time, stock, label=name)[0])
+        titles.append(name)
+    if len(titles) > 6:
+        ax.legend(plots, titles, fontsize="x-small", ncol=2 if len(titles) <= 20 else 3)
+    else:
+        ax.legend(plots, titles)
     plt.grid(visible=True)
     if use_file:
         plt.savefig(Path(__file__).parent / f"comparison.png", dpi=300)
-        plt.clf()
+        plt.close(fig)
         return None
     else:
         buf = io.BytesIO()
         plt.savefig(buf, format="png", dpi=300)
         buf.seek(0)
-        plt.clf()
+        plt.close(fig)
+        if cache_key is not None:
+            default_cache.put(cache_key, buf.getvalue())
         return buf
 
 
@@ -192,12 +380,17 @@ if __name__ == '__main__':
             name = sys.argv[1]
             print(f"{name=}")
             plot_and_save(name=name)
+        elif sys.argv[1] == "--released":
+            # python plot.py --released FROM [UNTIL], dates as YYYY-MM-DD
+            until = sys.argv[3] if len(sys.argv) > 3 else None
+            names = stock_history.titles_released_between(sys.argv[2], until)
         else:
             names = []
             for enum, name in enumerate(sys.argv):
                 if enum != 0:
                     names.append(name)
 
+        if len(names) != 0:
             print(f"{names=}")
             plot_compare(names=names, use_file=True)
     else:
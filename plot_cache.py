@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from stock_history import find_history_file
+
+
+def data_version(filepath) -> tuple:
+    # size and modification time change with every appended stock change
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def make_key(kind, titles, style, filepaths, **options) -> tuple:
+    return (kind,
+            tuple(titles),
+            style,
+            tuple(data_version(filepath) for filepath in filepaths),
+            tuple(sorted(options.items())))
+
+
+def history_key(name, style, **options) -> tuple:
+    filepath, title = find_history_file(name)
+    return make_key("history", [title], style, [filepath], **options)
+
+
+def compare_key(names, style, **options) -> tuple:
+    history_files = [find_history_file(name) for name in names]
+    return make_key("compare", [title for _, title in history_files], style,
+                    [filepath for filepath, _ in history_files], **options)
+
+
+class PlotCache:
+    """
+    Size bounded LRU cache of rendered png bytes with an optional on-disk tier.
+    Keys contain the data version of every plotted history, so a new stock change never returns a stale plot
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None, max_disk_files=500):
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory is not None else None
+        self.max_disk_files = max_disk_files
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+
+    def enable_disk_cache(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _disk_path(self, key) -> Path:
+        return self.directory / f"{hashlib.sha1(repr(key).encode()).hexdigest()}.png"
+
+    def get(self, key):
+        with self._lock:
+            png = self.entries.get(key, None)
+            if png is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return png
+        if self.directory is not None:
+            try:
+                png = self._disk_path(key).read_bytes()
+            except FileNotFoundError:
+                png = None
+            if png is not None:
+                self.stats["disk_hits"] += 1
+                self._store(key, png)
+                return png
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key, png: bytes):
+        self._store(key, png)
+        if self.directory is not None:
+            self._disk_path(key).write_bytes(png)
+            self._prune_disk()
+
+    def _store(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = png
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def _prune_disk(self):
+        files = sorted(self.directory.glob("*.png"), key=lambda path: path.stat().st_mtime)
+        for path in files[:max(len(files) - self.max_disk_files, 0)]:
+            path.unlink(missing_ok=True)
+
+    def invalidate(self, title):
+        # drop every plot containing the title, stale files on disk are never hit again and pruned over time
+        with self._lock:
+            for key in [key for key in self.entries if title in key[1]]:
+                self.size -= len(self.entries.pop(key))
+                self.stats["invalidations"] += 1
+
+
+default_cache = PlotCache()
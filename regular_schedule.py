@@ -0,0 +1,72 @@
+import datetime
+from bisect import bisect_left, bisect_right
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+
+class RegularSchedule:
+    """
+    The "delta" config of general_alerts.json compiled into one sorted index of weekly fire times,
+    seconds since monday 00:00 wall clock time. "everyday" entries are added to every weekday
+    """
+
+    def __init__(self, deltas: dict):
+        offsets = set()
+        for day, weekday in enumerate(WEEKDAYS):
+            for seconds in list(deltas.get("everyday", [])) + list(deltas.get(weekday, [])):
+                offsets.add(day * SECONDS_PER_DAY + seconds)
+        self.offsets = sorted(offsets)
+        self._due_at = {}
+
+    @staticmethod
+    def _week_start(wall_time):
+        midnight = wall_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight - datetime.timedelta(days=wall_time.weekday())
+
+    def previous_fire_time(self, wall_time):
+        """
+        latest scheduled time at or before the given naive wall clock time
+        """
+        if len(self.offsets) == 0:
+            return None
+        week_start = self._week_start(wall_time)
+        index = bisect_right(self.offsets, (wall_time - week_start).total_seconds())
+        if index == 0:
+            return week_start + datetime.timedelta(seconds=self.offsets[-1] - SECONDS_PER_WEEK)
+        return week_start + datetime.timedelta(seconds=self.offsets[index - 1])
+
+    def next_fire_time(self, wall_time):
+        """
+        first scheduled time after the given naive wall clock time
+        """
+        if len(self.offsets) == 0:
+            return None
+        week_start = self._week_start(wall_time)
+        offset = (wall_time - week_start).total_seconds()
+        index = bisect_left(self.offsets, offset)
+        if index < len(self.offsets) and self.offsets[index] == offset:
+            index += 1
+        if index == len(self.offsets):
+            return week_start + datetime.timedelta(seconds=self.offsets[0] + SECONDS_PER_WEEK)
+        return week_start + datetime.timedelta(seconds=self.offsets[index])
+
+    def is_due(self, current_time, last_timestamp=None) -> bool:
+        """
+        True if a scheduled time passed since the last regular update. After a downtime only one update is due,
+        no matter how many scheduled times were missed. The next fire time is computed once per last update,
+        all other calls are a single comparison. Without a last update, only a scheduled time of today is due
+        """
+        if len(self.offsets) == 0:
+            return False
+        wall_time = current_time.replace(tzinfo=None)
+        if last_timestamp is None:
+            midnight = wall_time.replace(hour=0, minute=0, second=0, microsecond=0)
+            return self.previous_fire_time(wall_time) >= midnight
+        due_at = self._due_at.get(last_timestamp, None)
+        if due_at is None:
+            last_alert = datetime.datetime.fromtimestamp(last_timestamp, tz=current_time.tzinfo)
+            due_at = self.next_fire_time(last_alert.replace(tzinfo=None))
+            self._due_at = {last_timestamp: due_at}
+        return wall_time >= due_at
@@ -0,0 +1,138 @@
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import stock_history
+from metrics import default_metrics as metrics
+from plot_cache import default_cache, history_key, compare_key
+from storage import default_storage
+
+
+class RenderQueueFull(Exception):
+    pass
+
+
+def _warm_up():
+    # runs once in every worker, so the first render does not pay for the matplotlib import, the font cache
+    # and the first draw of the Agg backend
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import plot
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [1, 0], label="warm up")
+    ax.legend()
+    fig.savefig(io.BytesIO(), format="png", dpi=30)
+    plt.close(fig)
+
+
+def _ping():
+    return True
+
+
+def _render_history(data_dir, name, style):
+    import plot
+    # the data directory of the bot, also if it was redirected after the worker started
+    stock_history.DATA_DIR = Path(data_dir)
+    return plot.plot_stock_history(name=name, style=style, print_to_console=False, use_cache=False,
+                                   downsample=True).getvalue()
+
+
+def _render_compare(data_dir, names, style):
+    import plot
+    stock_history.DATA_DIR = Path(data_dir)
+    return plot.plot_compare(names=names, style=style, use_cache=False, downsample=True).getvalue()
+
+
+class RenderPool:
+    """
+    Renders plots in pre-warmed worker processes, so a render never blocks the event loop
+    and two renders never share the global pyplot state.
+    At most max_queue renders are queued or running. A render is given up after timeout seconds, a queued one is
+    cancelled, a running one can not be stopped and keeps its slot until its worker is done with it.
+    resolve_title maps an abbreviation to its full title in the bot process, the workers only get full titles
+    """
+
+    def __init__(self, workers=2, max_queue=8, timeout=60.0, resolve_title=None):
+        self.workers = workers
+        self.resolve_title = resolve_title
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self.executor = None
+        self._pings = []
+
+    def start(self):
+        if self.executor is None:
+            # spawn instead of fork, the bot process runs an event loop and several threads
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=_warm_up)
+            self._pings = [self.executor.submit(_ping) for _ in range(self.workers)]
+
+    async def warm_up(self):
+        # starts the workers and waits until all of them finished their warm up
+        self.start()
+        await asyncio.gather(*[asyncio.wrap_future(ping) for ping in self._pings])
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def _submit(self, function, *args) -> bytes:
+        if self.pending >= self.max_queue:
+            metrics.incr("renders_rejected_total")
+            raise RenderQueueFull(f"{self.pending} renders are already queued")
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = self.executor.submit(function, *args)
+        self.pending += 1
+
+        def done(_):
+            # called in a thread of the executor once the worker finished, also after the caller timed out
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # the event loop is closed, nothing waits for the slot anymore
+                pass
+
+        future.add_done_callback(done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            metrics.incr("renders_timed_out_total")
+            raise
+
+    def _release(self):
+        self.pending -= 1
+
+    def resolve(self, name) -> str:
+        title = self.resolve_title(name) if self.resolve_title is not None else None
+        # titles created after the index was built are found by their name
+        for candidate in (title, name):
+            if candidate is not None and default_storage.exists(stock_history.find_history_file(candidate)[0]):
+                return candidate
+        raise FileNotFoundError(f"no history for '{name}'")
+
+    async def plot_stock_history(self, name, style="seaborn-dark"):
+        name = self.resolve(name)
+        key = history_key(name, style, use_markers=False, first_sold_out_only=True, downsample=True)
+        png = default_cache.get(key)
+        if png is None:
+            with metrics.span("render_history"):
+                png = await self._submit(_render_history, str(stock_history.DATA_DIR), name, style)
+            default_cache.put(key, png)
+        return io.BytesIO(png)
+
+    async def plot_compare(self, names, style="seaborn-dark"):
+        names = [self.resolve(name) for name in names]
+        key = compare_key(names, style, downsample=True)
+        png = default_cache.get(key)
+        if png is None:
+            with metrics.span("render_compare"):
+                png = await self._submit(_render_compare, str(stock_history.DATA_DIR), names, style)
+            default_cache.put(key, png)
+        return io.BytesIO(png)
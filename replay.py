@@ -0,0 +1,194 @@
+# Replays a recorded log of api responses through the tracking cycle on a simulated clock,
+# e.g. a whole drop day in a few seconds. The log is written by the tracker or the bot if
+# DISPLATE_RECORD_FILE (or "record_file" in bot_config.json) is set.
+# usage: python replay.py LOG.jsonl.gz [--data-dir DIR] [--alerts FILE]
+import argparse
+import atexit
+import gzip
+import json
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from edition import Listing
+
+
+class ResponseRecorder:
+    """
+    Appends every listing, manual lookup and upcoming id of the mails with its timestamp to a gzip compressed JSON lines file.
+    Every record is sync flushed, so the records before a crash can still be read. Every start appends a new gzip member,
+    the member of a crashed run has no trailer and is read up to its last flushed record by read_log.
+    Unchanged listings are stored without their body
+    """
+
+    def __init__(self, filepath):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self.file = gzip.open(self.filepath, 'ab')
+        self._lock = threading.Lock()
+        # writes the trailer of the member when the tracker or the bot exits
+        atexit.register(self.close)
+
+    def record(self, kind, body, timestamp, le_id=None):
+        record = {"t": timestamp, "kind": kind}
+        if le_id is not None:
+            record["id"] = le_id
+        if body is not None:
+            record["body"] = body
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            self.file.write(line)
+            self.file.flush(zlib.Z_SYNC_FLUSH)
+
+    def close(self):
+        with self._lock:
+            self.file.close()
+        atexit.unregister(self.close)
+
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+
+def read_members(data: bytes):
+    # yields the decompressed content of every gzip member. A member without a trailer (the recorder crashed)
+    # is followed by the header of the next one, which is no valid deflate block, so it is decompressed again
+    # up to the next gzip header. A record that was cut off is lost, the records before and after it are kept
+    start = 0
+    while start < len(data):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        try:
+            content = decompressor.decompress(data[start:])
+            end = len(data) - len(decompressor.unused_data)
+        except zlib.error:
+            end = data.find(GZIP_MAGIC, start + 1)
+            end = len(data) if end == -1 else end
+            try:
+                content = zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(data[start:end])
+            except zlib.error:
+                content = b""
+        yield content
+        start = end
+
+
+def read_log(filepath):
+    """
+    yields the records of a log, member by member. A member that was cut off by a crash loses only the record
+    that was being written
+    """
+    with open(filepath, 'rb') as file:
+        data = file.read()
+    for content in read_members(data):
+        for line in content.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class ReplayFetcher:
+    """
+    Stands in for fetcher.ListingFetcher and returns the recorded listings in order
+    """
+
+    def __init__(self):
+        self.listing = None
+        self.changed = False
+        self.stats = {"requests": 0, "not_modified": 0, "same_body": 0, "changed": 0, "short_circuited": 0}
+
+    def set_response(self, body):
+        self.changed = body is not None
+        if body is not None:
+            self.listing = Listing(body)
+
+    def fetch(self, url):
+        self.stats["requests"] += 1
+        self.stats["changed" if self.changed else "not_modified"] += 1
+        return self.listing, self.changed
+
+    def commit(self):
+        if self.listing is not None:
+            self.listing.release()
+
+    def short_circuit(self):
+        self.stats["short_circuited"] += 1
+
+
+def replay(log_path, data_dir, alerts_path=None) -> dict:
+    import main as tracker
+    from adaptive_poller import AdaptivePoller
+    clock = {"now": 0.0}
+    tracker.use_base_dir(data_dir)
+    tracker.current_timestamp = lambda: clock["now"]
+    tracker.poller = AdaptivePoller(clock=lambda: clock["now"])
+    fetcher = tracker.listing_fetcher = ReplayFetcher()
+    lookups = {}
+
+    def lookup(id):
+        if id not in lookups:
+            raise KeyError(f"no recorded response for {id}")
+        return lookups[id]
+
+    tracker.manually_check_displate = lookup
+    upcoming = {"id": None}
+    tracker.get_limited_edition_id = lambda: upcoming["id"]
+    stats = {"cycles": 0, "alerts": 0, "first": None, "last": None}
+    alerts_file = open(alerts_path, 'w+') if alerts_path is not None else None
+
+    def run_cycle(record):
+        clock["now"] = record["t"]
+        fetcher.set_response(record.get("body", None))
+        output, cycle_time = tracker.main()
+        stats["cycles"] += 1
+        stats["first"] = stats["first"] or record["t"]
+        stats["last"] = record["t"]
+        message = tracker.format_alert_message(output["alert"])
+        if message != "":
+            stats["alerts"] += 1
+            if alerts_file is not None:
+                alerts_file.write(json.dumps({"time": cycle_time.isoformat(), "message": message}) + "\n")
+
+    started = time.perf_counter()
+    try:
+        pending = None
+        for record in read_log(log_path):
+            if record["kind"] == "lookup":
+                # the lookups of a cycle are recorded after its listing
+                lookups[record["id"]] = record["body"]
+                continue
+            if pending is not None:
+                run_cycle(pending)
+                pending = None
+            if record["kind"] == "upcoming":
+                upcoming["id"] = record["body"]["id"]
+            elif record["kind"] == "listing":
+                pending = record
+        if pending is not None:
+            run_cycle(pending)
+    finally:
+        if alerts_file is not None:
+            alerts_file.close()
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", help="gzip compressed log written with DISPLATE_RECORD_FILE")
+    parser.add_argument("--data-dir", help="scratch directory for local_state.json and data/, a temporary one "
+                                           "if not given")
+    parser.add_argument("--alerts", help="writes the alert messages as JSON lines, defaults to alerts.jsonl "
+                                         "in the scratch directory")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as temporary:
+        data_dir = Path(args.data_dir or temporary)
+        alerts_path = args.alerts or data_dir / "alerts.jsonl"
+        stats = replay(args.log, data_dir, alerts_path)
+        simulated = (stats["last"] or 0) - (stats["first"] or 0)
+        print(f"{stats['cycles']} cycles covering {simulated / 3600:.1f}h replayed in {stats['seconds']:.2f}s "
+              f"({simulated / max(stats['seconds'], 1e-9):.0f}x real time), {stats['alerts']} cycles with alerts")
+        if args.data_dir is None:
+            print(f"alerts written to {alerts_path}" if args.alerts else "use --data-dir to keep the results")
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from urllib.parse import urlparse
+
+import aiohttp
+
+from metrics import default_metrics as metrics
+from storage import default_storage
+
+CHUNK_SIZE = 64 * 1024
+# larger downloads are aborted, the full size reveal images are a few MB
+MAX_IMAGE_BYTES = 25 * 1024 * 1024
+
+
+def image_path(directory, url, max_size=None) -> Path:
+    # the url is part of the name, so a changed image of the same title is downloaded again
+    digest = hashlib.sha1(url.encode()).hexdigest()[:12]
+    if max_size is not None:
+        return Path(directory) / f"reveal-{digest}-{max_size}.jpg"
+    suffix = Path(urlparse(url).path).suffix or ".jpg"
+    return Path(directory) / f"reveal-{digest}{suffix}"
+
+
+async def download(session, url, filepath, timeout=30.0, max_bytes=MAX_IMAGE_BYTES):
+    """
+    streams the response into a temporary file next to filepath and renames it once it is complete
+    """
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                response.raise_for_status()
+                size = 0
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"reveal image is larger than {max_bytes} bytes")
+                    file.write(chunk)
+        os.replace(temp_path, filepath)
+        metrics.incr("bytes_downloaded_total", size, kind="reveal")
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def downscale(source, target, max_size, quality=85) -> bool:
+    """
+    writes a jpeg of source with its longest side limited to max_size pixels, needs Pillow.
+    Returns False if Pillow is not installed
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        print("Pillow is not installed, reveal images are uploaded in full size")
+        return False
+    with Image.open(source) as image:
+        image.thumbnail((max_size, max_size))
+        fd, temp_path = tempfile.mkstemp(dir=Path(target).parent, prefix=f".{Path(target).name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            image.convert("RGB").save(temp_path, format="JPEG", quality=quality, optimize=True)
+            os.replace(temp_path, target)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+    return True
+
+
+async def get_reveal_image(session, directory, url, max_size=None, timeout=30.0) -> Path:
+    """
+    path of the reveal image in the directory of its title, downloaded only if it is not cached yet
+    and optionally downscaled so its longest side is at most max_size pixels
+    """
+    original = image_path(directory, url)
+    if max_size is not None:
+        scaled = image_path(directory, url, max_size)
+        if default_storage.exists(scaled):
+            metrics.incr("reveal_images_total", cached="true")
+            return scaled
+    if default_storage.exists(original):
+        metrics.incr("reveal_images_total", cached="true")
+    else:
+        metrics.incr("reveal_images_total", cached="false")
+        with metrics.span("download_reveal"):
+            await download(session, url, original, timeout=timeout)
+    if max_size is not None and await asyncio.to_thread(downscale, original, scaled, max_size):
+        return scaled
+    return original
@@ -0,0 +1,109 @@
+from collections import deque
+from pathlib import Path
+
+import stock_history
+
+# rolling windows of the sales rate in seconds, the shortest one with sales is used for the sell-out ETA
+WINDOWS = (3600.0, 86400.0)
+# a rate is never computed over less than this, so the first sale after a drop does not look like thousands per hour
+MIN_SPAN = 300.0
+
+
+class TitleSales:
+    __slots__ = ("stock", "first_seen", "sales", "sold")
+
+    def __init__(self, timestamp, stock):
+        self.stock = stock
+        self.first_seen = timestamp
+        # one deque of (timestamp, sold) and one running sum per window
+        self.sales = [deque() for _ in WINDOWS]
+        self.sold = [0 for _ in WINDOWS]
+
+
+class SalesTracker:
+    """
+    Rolling sales rates and sell-out ETAs per title. Every stock change is an O(1) update of one deque
+    and one running sum per window, old sales are dropped from the front when the window moves on
+    """
+
+    def __init__(self):
+        self.titles = {}
+        self.seeded = False
+
+    def record(self, title, timestamp, stock):
+        entry = self.titles.get(title, None)
+        if entry is None:
+            self.titles[title] = TitleSales(timestamp, stock)
+            return
+        sold = entry.stock - stock
+        entry.stock = stock
+        if sold <= 0:
+            # restocks and repeated values are not sales
+            return
+        for index, window in enumerate(WINDOWS):
+            entry.sales[index].append((timestamp, sold))
+            entry.sold[index] += sold
+            self._expire(entry, index, timestamp - window)
+
+    @staticmethod
+    def _expire(entry, index, oldest):
+        sales = entry.sales[index]
+        while sales and sales[0][0] < oldest:
+            entry.sold[index] -= sales.popleft()[1]
+
+    def rate(self, title, now, window=WINDOWS[0]) -> float:
+        """
+        sold displates per hour within the window ending at now
+        """
+        entry = self.titles.get(title, None)
+        if entry is None:
+            return 0.0
+        index = WINDOWS.index(window)
+        self._expire(entry, index, now - window)
+        span = max(min(window, now - entry.first_seen), MIN_SPAN)
+        return entry.sold[index] / span * 3600.0
+
+    def estimate(self, title, now) -> dict:
+        """
+        current rate per hour of every window and the epoch timestamp the title is expected to sell out at,
+        None if it is sold out or nothing was sold within the longest window
+        """
+        entry = self.titles.get(title, None)
+        rates = {f"{int(window // 3600)}h": self.rate(title, now, window) for window in WINDOWS}
+        sell_out = None
+        if entry is not None and entry.stock > 0:
+            for rate in rates.values():
+                if rate > 0:
+                    sell_out = now + entry.stock / rate * 3600.0
+                    break
+        return {"rates": rates, "sell_out": sell_out}
+
+    def seed(self, data_dir):
+        """
+        replays the stored histories once, only the sales within the longest window are kept
+        """
+        self.seeded = True
+        data_dir = Path(data_dir)
+        if not data_dir.exists():
+            return
+        for directory in data_dir.iterdir():
+            filepath = stock_history.get_history_path(directory)
+            if not filepath.exists():
+                continue
+            rows = stock_history.iter_binary(filepath) if stock_history.is_binary(filepath) \
+                else stock_history.iter_csv(filepath)
+            try:
+                for timestamp, stock in rows:
+                    self.record(directory.name, timestamp, stock)
+            except (ValueError, IndexError) as error:
+                print(f"Error while reading the history of '{directory.name}':", error)
+
+
+def format_duration(seconds) -> str:
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours}h {minutes}m"
+    return f"{hours // 24}d {hours % 24}h"
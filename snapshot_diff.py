@@ -0,0 +1,51 @@
+from typing import NamedTuple, Optional
+
+from edition import Edition
+
+BACK = "back"
+SOLD_OUT = "sold_out"
+STOCK_CHANGED = "stock_changed"
+EA_OVER = "ea_over"
+NEW_UPCOMING = "new_upcoming"
+
+
+class DiffEvent(NamedTuple):
+    kind: str
+    le_id: int
+    title: str
+    stock: Optional[int] = None
+    previous_stock: Optional[int] = None
+    edition: Optional[Edition] = None
+
+
+def build_snapshot(editions) -> dict:
+    return {edition.le_id: edition for edition in editions}
+
+
+def diff_snapshots(previous_active: dict, current_active: dict,
+                   previous_upcoming: dict = None, current_upcoming: dict = None,
+                   upcoming_le_id=None) -> list:
+    """
+    Compares two snapshots of editions keyed by itemCollectionId in linear time.
+    Events are ordered like the listing: back / ea_over / stock_changed for the current displates,
+    then sold_out for the displates that disappeared, then new_upcoming
+    """
+    events = []
+    for le_id, edition in current_active.items():
+        stock = edition.available
+        previous = previous_active.get(le_id, None)
+        if previous is None:
+            kind = EA_OVER if le_id == upcoming_le_id else BACK
+            events.append(DiffEvent(kind, le_id, edition.title, stock, None, edition))
+        else:
+            if stock != previous.available:
+                events.append(DiffEvent(STOCK_CHANGED, le_id, edition.title, stock, previous.available, edition))
+    for le_id, previous in previous_active.items():
+        if le_id not in current_active:
+            events.append(DiffEvent(SOLD_OUT, le_id, previous.title, 0, previous.available, previous))
+    # without a previous list of upcoming displates every upcoming displate would count as new
+    if previous_upcoming and current_upcoming:
+        for le_id, edition in current_upcoming.items():
+            if le_id not in previous_upcoming:
+                events.append(DiffEvent(NEW_UPCOMING, le_id, edition.title, edition=edition))
+    return events
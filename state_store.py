@@ -0,0 +1,100 @@
+import json
+import os
+from pathlib import Path
+
+# atomic_write moved to storage, it is still imported from here
+from storage import atomic_write, default_storage
+from edition import Edition
+
+STATE_VERSION = 1
+# short keys for the fields of the early access displate, only keys present in local_data are stored
+UPCOMING_LE_KEYS = {"upcoming_le_id": "id", "upcoming_le_stock": "stock", "upcoming_le_status": "status"}
+
+
+def encode_state(local_data) -> str:
+    state = {"v": STATE_VERSION,
+             "active": [[e.le_id, e.title, e.available] for e in local_data.get("previous_active_displates", [])],
+             "upcoming": [[e.le_id, e.title] for e in local_data.get("previous_upcoming_displates", [])],
+             "upcoming_le": {short: local_data[key] for key, short in UPCOMING_LE_KEYS.items() if key in local_data}}
+    return json.dumps(state, separators=(",", ":"), ensure_ascii=False)
+
+
+def decode_state(content: str) -> dict:
+    state = json.loads(content)
+    if state.get("v", None) != STATE_VERSION:
+        raise ValueError(f"unsupported state version {state.get('v', None)}")
+    local_data = {"previous_active_displates": [Edition(le_id, title, "active", stock)
+                                                for le_id, title, stock in state["active"]],
+                  "previous_upcoming_displates": [Edition(le_id, title, "upcoming")
+                                                  for le_id, title in state["upcoming"]]}
+    for key, short in UPCOMING_LE_KEYS.items():
+        if short in state["upcoming_le"]:
+            local_data[key] = state["upcoming_le"][short]
+    return local_data
+
+
+def set_aside(filepath, err, where):
+    # keep the broken file for inspection instead of silently starting from an empty state
+    broken = filepath.with_suffix(filepath.suffix + ".corrupt")
+    os.replace(filepath, broken)
+    print(f"Error in {where}: {err}, moved the state to {broken}")
+
+
+class StateStore:
+    """
+    Keeps only what the diff needs (ids, titles, stock and the early access fields) in a compact file.
+    The file is written atomically and only if the state changed since the last load or save
+    """
+
+    def __init__(self):
+        self.filepath = None
+        self.encoded = None
+        self.writes = 0
+        self.skipped_writes = 0
+
+    def load(self, filepath, legacy_filepath=None) -> dict:
+        filepath = Path(filepath)
+        if self.filepath == filepath and self.encoded is not None:
+            return decode_state(self.encoded)
+        self.filepath = filepath
+        self.encoded = None
+        if not filepath.exists():
+            if legacy_filepath is not None and Path(legacy_filepath).exists():
+                return self.migrate(legacy_filepath)
+            return {}
+        content = filepath.read_text()
+        try:
+            local_data = decode_state(content)
+        except (ValueError, KeyError, TypeError) as err:
+            set_aside(filepath, err, "StateStore.load")
+            return {}
+        self.encoded = content
+        return local_data
+
+    def migrate(self, legacy_filepath) -> dict:
+        legacy_filepath = Path(legacy_filepath)
+        try:
+            with open(legacy_filepath) as json_file:
+                local_data = json.load(json_file)
+            # the legacy file holds whole api responses
+            for key in ("previous_active_displates", "previous_upcoming_displates"):
+                local_data[key] = [Edition.from_api(displate) for displate in local_data.get(key, [])]
+        except (ValueError, KeyError, TypeError, AttributeError) as err:
+            set_aside(legacy_filepath, err, "StateStore.migrate")
+            return {}
+        self.save(self.filepath, local_data)
+        os.replace(legacy_filepath, legacy_filepath.with_suffix(legacy_filepath.suffix + ".migrated"))
+        print(f"Migrated {legacy_filepath.name} to {self.filepath.name}")
+        return decode_state(self.encoded)
+
+    def save(self, filepath, local_data) -> bool:
+        filepath = Path(filepath)
+        encoded = encode_state(local_data)
+        if filepath == self.filepath and encoded == self.encoded:
+            self.skipped_writes += 1
+            return False
+        default_storage.atomic_write(filepath, encoded)
+        self.filepath = filepath
+        self.encoded = encoded
+        self.writes += 1
+        return True
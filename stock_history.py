@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+from metrics import default_metrics as metrics
+from storage import default_storage as storage
+
+# directory with one sub directory per title, can be redirected e.g. for benchmarks
+DATA_DIR = Path(__file__).parent / "data"
+CSV_HISTORY_FILE = "stockchanges.csv"
+BINARY_HISTORY_FILE = "stockchanges.bin"
+# "csv" or "binary", decides which file new stock changes are appended to
+HISTORY_BACKEND = os.environ.get("DISPLATE_HISTORY_BACKEND", "csv")
+
+# little endian float64 timestamp followed by an int32 stock value, no padding
+RECORD = struct.Struct("<di")
+RECORD_SIZE = RECORD.size
+
+
+def get_history_path(directory, backend=None) -> Path:
+    """
+    returns the history file of a title directory, preferring the configured backend
+    but falling back to the other one if only that one exists
+    """
+    backend = backend or HISTORY_BACKEND
+    preferred, other = CSV_HISTORY_FILE, BINARY_HISTORY_FILE
+    if backend == "binary":
+        preferred, other = other, preferred
+    filepath = Path(directory, preferred)
+    if not storage.exists(filepath) and storage.exists(Path(directory, other)):
+        return Path(directory, other)
+    return filepath
+
+
+def find_history_file(title, data_dir=None):
+    """
+    returns the history file of a full title and the title, abbreviations are resolved by the caller
+    """
+    return get_history_path(Path(data_dir or DATA_DIR, title)), title
+
+
+def titles_released_between(start, end=None) -> list:
+    """
+    titles with a startDate within [start, end], dates as YYYY-MM-DD, sorted by their startDate
+    """
+    end = end or "9999-12-31"
+    titles = []
+    if not DATA_DIR.exists():
+        return titles
+    for directory in DATA_DIR.iterdir():
+        filepath = directory / "metadata.json"
+        if not filepath.exists() or not get_history_path(directory).exists():
+            continue
+        with open(filepath) as json_file:
+            start_date = json.load(json_file).get("edition", {}).get("startDate", None)
+        if start_date is not None and start <= start_date[:10] <= end:
+            titles.append((start_date, directory.name))
+    return [title for _, title in sorted(titles)]
+
+
+def is_binary(filepath) -> bool:
+    return Path(filepath).suffix == ".bin"
+
+
+def iter_csv(filepath):
+    with open(filepath) as csv_file:
+        csv_reader = csv.reader(csv_file, delimiter=',')
+        next(csv_reader, None)
+        for row in csv_reader:
+            yield float(row[0]), int(row[1])
+
+
+def iter_binary(filepath):
+    with open(filepath, 'rb') as file:
+        content = file.read()
+    # ignore a partially written record at the end of the file
+    usable = len(content) - len(content) % RECORD_SIZE
+    yield from RECORD.iter_unpack(content[:usable])
+
+
+def read_binary(filepath):
+    """
+    memory-maps a binary history and returns the timestamps (float64) and stock values (int32) as numpy arrays
+    """
+    import numpy as np
+    dtype = np.dtype([("time", "<f8"), ("stock", "<i4")])
+    count = os.path.getsize(filepath) // RECORD_SIZE
+    if count == 0:
+        return np.empty(0, dtype="<f8"), np.empty(0, dtype="<i4")
+    records = np.memmap(filepath, dtype=dtype, mode='r', shape=(count,))
+    return records["time"], records["stock"]
+
+
+def parse_csv_rows(raw: bytes):
+    import numpy as np
+    values = np.fromstring(raw.decode().replace(",", " "), dtype=np.float64, sep=" ").reshape(-1, 2)
+    return values[:, 0].copy(), values[:, 1].astype(np.int64)
+
+
+def load_history(filepath):
+    """
+    returns the epoch timestamps (float64) and the stock values (int64) of a history file as numpy arrays
+    """
+    import numpy as np
+    if is_binary(filepath):
+        times, stocks = read_binary(filepath)
+        return np.asarray(times, dtype=np.float64), np.asarray(stocks, dtype=np.int64)
+    with open(filepath, 'rb') as csv_file:
+        csv_file.readline()
+        return parse_csv_rows(csv_file.read())
+
+
+def convert_csv_to_binary(csv_path, binary_path):
+    binary_path = Path(binary_path)
+    binary_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = binary_path.with_suffix(".bin.tmp")
+    count = 0
+    with open(temp_path, 'wb') as file:
+        for timestamp, stock in iter_csv(csv_path):
+            file.write(RECORD.pack(timestamp, stock))
+            count += 1
+    metrics.incr("bytes_written_total", count * RECORD_SIZE, file=BINARY_HISTORY_FILE)
+    os.replace(temp_path, binary_path)
+
+
+def export_csv(binary_path, csv_path):
+    with open(csv_path, 'w+', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["datetime", "available_stock"])
+        for timestamp, stock in iter_binary(binary_path):
+            writer.writerow([timestamp, stock])
+
+
+if __name__ == '__main__':
+    # python stock_history.py convert|export [TITLE ...], without titles every title in data/ is processed
+    if len(sys.argv) < 2 or sys.argv[1] not in ("convert", "export"):
+        print("usage: python stock_history.py convert|export [TITLE ...]")
+        sys.exit(1)
+    titles = sys.argv[2:] or [path.name for path in DATA_DIR.iterdir() if path.is_dir()]
+    for title in titles:
+        csv_path = DATA_DIR / title / CSV_HISTORY_FILE
+        binary_path = DATA_DIR / title / BINARY_HISTORY_FILE
+        if sys.argv[1] == "convert" and csv_path.exists():
+            if binary_path.exists():
+                # the binary history may already contain newer records than the csv
+                print(f"skipped {title}, {BINARY_HISTORY_FILE} already exists")
+                continue
+            convert_csv_to_binary(csv_path, binary_path)
+            print(f"converted {title}")
+        elif sys.argv[1] == "export" and binary_path.exists():
+            export_csv(binary_path, csv_path)
+            print(f"exported {title}")
@@ -0,0 +1,167 @@
+import csv
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from metrics import default_metrics as metrics
+
+
+def atomic_write(filepath, content: str, make_parents=True):
+    # write to a temporary file next to the target and rename it, so a crash never leaves a half written file
+    filepath = Path(filepath)
+    if make_parents:
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f".{filepath.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+            written = file.tell()
+        os.replace(temp_path, filepath)
+        metrics.incr("bytes_written_total", written, file=filepath.name)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+class Storage:
+    """
+    File access of the tracker. Directories and files that were seen or created once are remembered,
+    so a steady-state cycle makes no exists or mkdir calls for them. History files are kept open for
+    appending (at most max_open, least recently used are closed first) and written by flush() at the end
+    of every cycle, or after flush_interval seconds when a cycle appends for longer.
+    Files are never deleted by the tracker, a file removed or replaced by another process needs forget()
+    """
+
+    def __init__(self, max_open=64, flush_interval=5.0, clock=time.monotonic):
+        self.max_open = max_open
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.known = set()
+        # path -> [file, csv writer or None]
+        self.handles = OrderedDict()
+        self.unflushed = set()
+        self.last_flush = clock()
+        self.stats = {"checks": 0, "mkdirs": 0, "opens": 0, "flushes": 0}
+        # the tracking cycle runs in a worker thread of the bot, the commands on the event loop
+        self._lock = threading.RLock()
+
+    def exists(self, filepath) -> bool:
+        filepath = Path(filepath)
+        if filepath in self.known:
+            return True
+        self.stats["checks"] += 1
+        if filepath.exists():
+            self.known.add(filepath)
+            return True
+        return False
+
+    def ensure_dir(self, directory) -> Path:
+        directory = Path(directory)
+        if directory not in self.known:
+            self.stats["mkdirs"] += 1
+            directory.mkdir(parents=True, exist_ok=True)
+            self.known.add(directory)
+        return directory
+
+    def forget(self, filepath):
+        filepath = Path(filepath)
+        with self._lock:
+            self._close(filepath)
+            self.known.discard(filepath)
+
+    def read_json(self, filepath, default=None):
+        try:
+            with open(filepath) as json_file:
+                data = json.load(json_file)
+        except FileNotFoundError:
+            return default
+        self.known.add(Path(filepath))
+        return data
+
+    def write_json(self, filepath, data, **kwargs):
+        filepath = Path(filepath)
+        self.ensure_dir(filepath.parent)
+        with open(filepath, 'w+') as json_file:
+            json.dump(data, json_file, **kwargs)
+            metrics.incr("bytes_written_total", json_file.tell(), file=filepath.name)
+        self.known.add(filepath)
+
+    def atomic_write(self, filepath, content: str):
+        filepath = Path(filepath)
+        self.ensure_dir(filepath.parent)
+        atomic_write(filepath, content, make_parents=False)
+        self.known.add(filepath)
+
+    def append_history(self, directory, timestamp, stock, backend=None):
+        """
+        appends a stock change to the history file of the configured backend, a binary history
+        is created from an existing csv history first
+        """
+        import stock_history
+        backend = backend or stock_history.HISTORY_BACKEND
+        with self._lock:
+            if backend == "binary":
+                filepath = Path(directory, stock_history.BINARY_HISTORY_FILE)
+                if filepath not in self.handles and not self.exists(filepath):
+                    csv_path = filepath.with_name(stock_history.CSV_HISTORY_FILE)
+                    if self.exists(csv_path):
+                        self._close(csv_path)
+                        stock_history.convert_csv_to_binary(csv_path, filepath)
+                file, _ = self._handle(filepath, 'ab')
+                file.write(stock_history.RECORD.pack(timestamp, stock))
+                written = stock_history.RECORD_SIZE
+            else:
+                filepath = Path(directory, stock_history.CSV_HISTORY_FILE)
+                file, writer = self._handle(filepath, 'a')
+                written = 0
+                if file.tell() == 0:
+                    written += writer.writerow(["datetime", "available_stock"])
+                written += writer.writerow([timestamp, stock])
+            metrics.incr("bytes_written_total", written, file=filepath.name)
+            self.unflushed.add(filepath)
+            if self.clock() - self.last_flush >= self.flush_interval:
+                self.flush()
+
+    def _handle(self, filepath, mode) -> list:
+        handle = self.handles.get(filepath, None)
+        if handle is not None:
+            self.handles.move_to_end(filepath)
+            return handle
+        self.ensure_dir(filepath.parent)
+        while len(self.handles) >= self.max_open:
+            self._close(next(iter(self.handles)))
+        self.stats["opens"] += 1
+        file = open(filepath, mode)
+        handle = self.handles[filepath] = [file, csv.writer(file) if 'b' not in mode else None]
+        self.known.add(filepath)
+        return handle
+
+    def _close(self, filepath):
+        handle = self.handles.pop(filepath, None)
+        if handle is not None:
+            handle[0].close()
+        self.unflushed.discard(filepath)
+
+    def flush(self):
+        with self._lock:
+            for filepath in self.unflushed:
+                self.handles[filepath][0].flush()
+                self.stats["flushes"] += 1
+            self.unflushed.clear()
+            self.last_flush = self.clock()
+
+    def close(self):
+        # flushes and closes every open file and forgets the known paths
+        with self._lock:
+            for filepath in list(self.handles):
+                self._close(filepath)
+            self.known.clear()
+
+
+default_storage = Storage()
@@ -0,0 +1,24 @@
+from adaptive_poller import AdaptivePoller
+
+DROP = 1_700_000_000.0
+
+
+def test_drop_is_followed_after_the_edition_became_active():
+    poller = AdaptivePoller(jitter=0.0)
+    poller.observe(0, start_dates=[DROP], now=DROP - 60)
+    assert poller.next_interval(now=DROP - 60) == poller.floor
+    # from its startDate on the edition is active and no longer in the upcoming start dates
+    poller.observe(0, start_dates=[], now=DROP + 60)
+    assert poller.next_interval(now=DROP + 60) == poller.floor
+    poller.observe(0, start_dates=[], now=DROP + poller.drop_follow - 60)
+    assert poller.next_interval(now=DROP + poller.drop_follow - 60) == poller.floor
+    poller.observe(0, start_dates=[], now=DROP + poller.drop_follow + 60)
+    assert poller.start_dates == []
+    assert poller.next_interval(now=DROP + poller.drop_follow + 60) > poller.floor
+
+
+def test_removed_future_start_date_is_forgotten():
+    poller = AdaptivePoller(jitter=0.0)
+    poller.observe(0, start_dates=[DROP], now=DROP - 86400)
+    poller.observe(0, start_dates=[], now=DROP - 86000)
+    assert poller.start_dates == []
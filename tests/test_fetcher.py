@@ -0,0 +1,92 @@
+import pytest
+
+import main as tracker
+from benchmarks.fake_api import FakeDisplateAPI, make_listing
+from fetcher import ListingFetcher
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    tracker.use_base_dir(tmp_path)
+    yield tmp_path
+    tracker.storage.close()
+
+
+def files_of(directory) -> dict:
+    return {path: (path.stat().st_size, path.stat().st_mtime_ns) for path in directory.rglob("*") if path.is_file()}
+
+
+def test_etag_answers_not_modified():
+    with FakeDisplateAPI() as api:
+        fetcher = ListingFetcher()
+        listing, changed = fetcher.fetch(api.url)
+        assert changed and len(listing.active) == 20 and len(listing.upcoming) == 3
+        fetcher.commit()
+        # only the editions are kept once the listing was processed
+        assert fetcher.listing.response is None
+        listing, changed = fetcher.fetch(api.url)
+        assert not changed and len(listing.active) == 20
+        assert api.not_modified == 1
+        assert fetcher.stats["not_modified"] == 1
+
+
+def test_if_modified_since_answers_not_modified():
+    with FakeDisplateAPI(etag=False) as api:
+        fetcher = ListingFetcher()
+        fetcher.fetch(api.url)
+        fetcher.commit()
+        assert fetcher.etag is None and fetcher.last_modified is not None
+        _, changed = fetcher.fetch(api.url)
+        assert not changed
+        assert api.not_modified == 1
+        api.set_listing(make_listing(active=5))
+        listing, changed = fetcher.fetch(api.url)
+        assert changed and len(listing.active) == 5
+
+
+def test_body_hash_without_conditional_requests():
+    with FakeDisplateAPI(conditional=False) as api:
+        fetcher = ListingFetcher()
+        fetcher.fetch(api.url)
+        fetcher.commit()
+        _, changed = fetcher.fetch(api.url)
+        assert not changed
+        assert api.not_modified == 0
+        assert fetcher.stats["same_body"] == 1
+        api.set_listing(make_listing(active=5))
+        _, changed = fetcher.fetch(api.url)
+        assert changed
+        assert fetcher.stats["changed"] == 2
+
+
+def test_failed_cycle_is_processed_again(data_dir, monkeypatch):
+    with FakeDisplateAPI() as api:
+        monkeypatch.setattr(tracker, "general_api_url", api.url)
+        process_listing = tracker.process_listing
+
+        def failing(*args, **kwargs):
+            raise OSError("disk full")
+
+        monkeypatch.setattr(tracker, "process_listing", failing)
+        output, _ = tracker.main()
+        assert output["stock"] == {}
+        assert tracker.listing_fetcher.etag is None
+        monkeypatch.setattr(tracker, "process_listing", process_listing)
+        output, _ = tracker.main()
+        assert len(output["stock"]) == 20
+        assert tracker.listing_fetcher.stats["changed"] == 2
+        assert api.not_modified == 0
+        assert (data_dir / "local_state.json").exists()
+
+
+def test_unchanged_listing_is_short_circuited(data_dir, monkeypatch):
+    with FakeDisplateAPI() as api:
+        monkeypatch.setattr(tracker, "general_api_url", api.url)
+        first, _ = tracker.main()
+        before = files_of(data_dir)
+        assert len(before) != 0
+        second, _ = tracker.main()
+        assert tracker.listing_fetcher.stats["short_circuited"] == 1
+        assert api.not_modified == 1
+        assert second["stock"] == first["stock"]
+        assert files_of(data_dir) == before
@@ -0,0 +1,41 @@
+import numpy as np
+
+from plot import downsample_steps
+
+
+def step_values(times, stock, at):
+    # the stock shown by a step plot at the given times
+    return stock[np.searchsorted(times, at, side="right") - 1]
+
+
+def history(count=20000, seed=1):
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.uniform(1, 120, count)) + 1.66e9
+    stock = np.maximum(500 - np.cumsum(rng.integers(0, 2, count)), 0).astype(np.int32)
+    # restocked after selling out, the first zero is not the last one
+    stock[count * 3 // 4:] += 40
+    stock[-10:] = 0
+    return times, stock
+
+
+def test_downsampled_steps_match_at_every_edge():
+    times, stock = history()
+    small_times, small_stock = downsample_steps(times, stock, max_points=400)
+    assert len(small_times) <= 400 + 1
+    # every kept point is a point of the full history
+    kept = np.searchsorted(times, small_times)
+    assert np.array_equal(times[kept], small_times) and np.array_equal(stock[kept], small_stock)
+    # the step plots agree at every bucket edge (400 points are 100 buckets) and at every kept point
+    edges = np.linspace(times[0], times[-1], 100 + 1)
+    at = np.r_[edges, edges[1:] - 1e-3, small_times]
+    assert np.array_equal(step_values(small_times, small_stock, at), step_values(times, stock, at))
+    assert small_stock.min() == stock.min() and small_stock.max() == stock.max()
+
+
+def test_first_sold_out_entry_is_kept():
+    times, stock = history()
+    first_zero = times[np.flatnonzero(stock == 0)[0]]
+    small_times, small_stock = downsample_steps(times, stock, max_points=40)
+    assert first_zero in small_times
+    assert small_stock[np.flatnonzero(small_times == first_zero)[0]] == 0
+    assert small_times[np.flatnonzero(small_stock == 0)[0]] == first_zero
@@ -0,0 +1,21 @@
+import datetime
+
+from regular_schedule import RegularSchedule
+
+MONDAY = datetime.datetime(2026, 10, 19)
+
+
+def test_fresh_install_waits_for_a_scheduled_time_of_today():
+    schedule = RegularSchedule({"everyday": [8 * 3600, 20 * 3600]})
+    assert not schedule.is_due(MONDAY.replace(hour=7))
+    assert schedule.is_due(MONDAY.replace(hour=8))
+    # the 20:00 update of sunday is not due on monday morning
+    assert not schedule.is_due(MONDAY.replace(hour=0, minute=30))
+
+
+def test_due_once_after_the_last_update():
+    schedule = RegularSchedule({"everyday": [8 * 3600, 20 * 3600]})
+    last = MONDAY.replace(hour=8).timestamp()
+    assert not schedule.is_due(MONDAY.replace(hour=19), last)
+    assert schedule.is_due(MONDAY.replace(hour=20), last)
+    assert schedule.is_due(MONDAY + datetime.timedelta(days=2), last)
@@ -0,0 +1,38 @@
+from replay import ResponseRecorder, read_log
+
+
+def record_listings(path, first, count):
+    recorder = ResponseRecorder(path)
+    for t in range(first, first + count):
+        recorder.record("listing", {"data": [], "t": t}, t)
+    return recorder
+
+
+def crash(recorder):
+    # what is on disk when the process dies: the flushed records, but no trailer of the gzip member
+    written = recorder.filepath.read_bytes()
+    recorder.close()
+    recorder.filepath.write_bytes(written)
+
+
+def test_log_of_restarts_is_read_member_by_member(tmp_path):
+    path = tmp_path / "log.jsonl.gz"
+    record_listings(path, 0, 3).close()
+    crash(record_listings(path, 3, 3))
+    record_listings(path, 6, 3).close()
+    assert [record["t"] for record in read_log(path)] == list(range(9))
+
+
+def test_record_cut_off_by_a_crash_is_dropped(tmp_path):
+    path = tmp_path / "log.jsonl.gz"
+    recorder = record_listings(path, 0, 3)
+    flushed = path.read_bytes()
+    recorder.record("listing", {"data": [], "t": 3}, 3)
+    cut = path.read_bytes()[:len(flushed) + 4]
+    recorder.close()
+    path.write_bytes(cut)
+    assert [record["t"] for record in read_log(path)] == [0, 1, 2]
+    record_listings(path, 4, 2).close()
+    records = list(read_log(path))
+    assert [record["t"] for record in records[:3]] == [0, 1, 2]
+    assert [record["t"] for record in records[-2:]] == [4, 5]
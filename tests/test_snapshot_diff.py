@@ -0,0 +1,70 @@
+from edition import Edition
+from snapshot_diff import build_snapshot, diff_snapshots, BACK, EA_OVER, NEW_UPCOMING, SOLD_OUT, STOCK_CHANGED
+
+
+def active(le_id, available, title=None):
+    return Edition(le_id, title or f"LE {le_id}", "active", available)
+
+
+def upcoming(le_id, title=None):
+    return Edition(le_id, title or f"LE {le_id}", "upcoming")
+
+
+def diff(previous, current, previous_upcoming=(), current_upcoming=(), upcoming_le_id=None):
+    return diff_snapshots(previous_active=build_snapshot(previous),
+                          current_active=build_snapshot(current),
+                          previous_upcoming=build_snapshot(previous_upcoming),
+                          current_upcoming=build_snapshot(current_upcoming),
+                          upcoming_le_id=upcoming_le_id)
+
+
+def test_new_active_edition_is_back():
+    events = diff([active(1, 10)], [active(1, 10), active(2, 5)])
+    assert [(event.kind, event.le_id, event.stock) for event in events] == [(BACK, 2, 5)]
+    assert events[0].previous_stock is None
+
+
+def test_new_active_edition_is_ea_over_for_the_upcoming_id():
+    events = diff([active(1, 10)], [active(1, 10), active(2, 5)], upcoming_le_id=2)
+    assert [(event.kind, event.le_id, event.stock) for event in events] == [(EA_OVER, 2, 5)]
+
+
+def test_stock_changed_carries_the_previous_stock():
+    events = diff([active(1, 10), active(2, 7)], [active(1, 8), active(2, 7)])
+    assert len(events) == 1
+    event = events[0]
+    assert (event.kind, event.le_id, event.title, event.stock, event.previous_stock) == (STOCK_CHANGED, 1, "LE 1", 8, 10)
+    assert event.edition.available == 8
+
+
+def test_sold_out_carries_the_previous_title():
+    events = diff([active(1, 3, title="Gone"), active(2, 7)], [active(2, 7)])
+    assert len(events) == 1
+    event = events[0]
+    assert (event.kind, event.le_id, event.title, event.stock, event.previous_stock) == (SOLD_OUT, 1, "Gone", 0, 3)
+
+
+def test_new_upcoming():
+    events = diff([], [], previous_upcoming=[upcoming(5)], current_upcoming=[upcoming(5), upcoming(6)])
+    assert [(event.kind, event.le_id, event.title) for event in events] == [(NEW_UPCOMING, 6, "LE 6")]
+
+
+def test_new_upcoming_is_suppressed_without_previous_upcoming():
+    # e.g. the first cycle after a restart without a state file
+    assert diff([], [], previous_upcoming=[], current_upcoming=[upcoming(5), upcoming(6)]) == []
+
+
+def test_events_follow_the_order_of_the_listing():
+    previous = [active(1, 10), active(2, 10), active(3, 10), active(4, 10)]
+    current = [active(4, 9), active(7, 5), active(2, 8), active(9, 1)]
+    events = diff(previous, current,
+                  previous_upcoming=[upcoming(20)], current_upcoming=[upcoming(22), upcoming(20), upcoming(21)],
+                  upcoming_le_id=9)
+    assert [(event.kind, event.le_id) for event in events] == [(STOCK_CHANGED, 4),
+                                                               (BACK, 7),
+                                                               (STOCK_CHANGED, 2),
+                                                               (EA_OVER, 9),
+                                                               (SOLD_OUT, 1),
+                                                               (SOLD_OUT, 3),
+                                                               (NEW_UPCOMING, 22),
+                                                               (NEW_UPCOMING, 21)]
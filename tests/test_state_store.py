@@ -0,0 +1,37 @@
+import json
+
+from benchmarks.fake_api import make_displate
+from state_store import StateStore
+
+
+def test_legacy_backup_is_migrated(tmp_path):
+    legacy = tmp_path / "local_backup.json"
+    active = [make_displate(1, available=7), make_displate(2, available=0)]
+    legacy.write_text(json.dumps({"previous_active_displates": active,
+                                  "previous_upcoming_displates": [make_displate(3, status="upcoming")],
+                                  "upcoming_le_id": 3}))
+    local_data = StateStore().load(tmp_path / "local_state.json", legacy_filepath=legacy)
+    assert [(e.le_id, e.available) for e in local_data["previous_active_displates"]] == [(1, 7), (2, 0)]
+    assert [e.le_id for e in local_data["previous_upcoming_displates"]] == [3]
+    assert local_data["upcoming_le_id"] == 3
+    assert not legacy.exists() and (tmp_path / "local_backup.json.migrated").exists()
+    # the next start loads the migrated state
+    reloaded = StateStore().load(tmp_path / "local_state.json", legacy_filepath=legacy)
+    assert [(e.le_id, e.title) for e in reloaded["previous_active_displates"]] == \
+           [(1, "Limited Edition 1"), (2, "Limited Edition 2")]
+
+
+def test_corrupt_state_is_set_aside(tmp_path):
+    state = tmp_path / "local_state.json"
+    state.write_text('{"v": 1, "active": [[1, "cut off')
+    assert StateStore().load(state) == {}
+    assert not state.exists() and (tmp_path / "local_state.json.corrupt").exists()
+
+
+def test_corrupt_legacy_backup_is_set_aside(tmp_path):
+    legacy = tmp_path / "local_backup.json"
+    legacy.write_text('{"previous_active_displates": [')
+    assert StateStore().load(tmp_path / "local_state.json", legacy_filepath=legacy) == {}
+    assert not legacy.exists() and (tmp_path / "local_backup.json.corrupt").exists()
+    legacy.write_text('{"previous_active_displates": ["not a displate"]}')
+    assert StateStore().load(tmp_path / "local_state.json", legacy_filepath=legacy) == {}
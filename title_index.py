@@ -0,0 +1,107 @@
+import difflib
+import json
+import threading
+from bisect import bisect_left
+from pathlib import Path
+
+ABBREVIATIONS_FILE = "abbreviations.csv"
+# disnake accepts at most 25 autocomplete choices of at most 100 characters
+MAX_CHOICES = 25
+
+
+class TitleIndex:
+    """
+    The titles of the data directory and the abbreviations in memory. Built once from the directory listing
+    and the abbreviations file, afterwards new titles and abbreviations are added by the tracker and the bot.
+    Titles and abbreviations are matched case-insensitively, completions are prefix, word prefix,
+    substring and finally fuzzy matches
+    """
+
+    def __init__(self, data_dir=None):
+        self.data_dir = Path(data_dir) if data_dir is not None else None
+        # lower case title -> title
+        self.titles = {}
+        # lower case abbreviation -> title
+        self.abbreviations = {}
+        self._sorted = []
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def set_data_dir(self, data_dir):
+        data_dir = Path(data_dir)
+        if data_dir != self.data_dir:
+            self.data_dir = data_dir
+            self.load()
+
+    def load(self):
+        titles = {}
+        abbreviations = {}
+        if self.data_dir is not None and self.data_dir.exists():
+            titles = {directory.name.lower(): directory.name for directory in self.data_dir.iterdir()
+                      if directory.is_dir()}
+            filepath = self.data_dir / ABBREVIATIONS_FILE
+            if filepath.exists():
+                with open(filepath) as json_file:
+                    abbreviations = {key.lower(): title for key, title in json.load(json_file).items()}
+        with self._lock:
+            self.titles = titles
+            self.abbreviations = abbreviations
+            self._dirty = True
+
+    def add_title(self, title):
+        if title is None or title.lower() in self.titles:
+            return
+        with self._lock:
+            self.titles[title.lower()] = title
+            self._dirty = True
+
+    def set_abbreviation(self, abbreviation, title):
+        with self._lock:
+            self.abbreviations[abbreviation.lower()] = title
+
+    def get_title(self, title):
+        # the stored spelling of a title, None if it is unknown
+        return self.titles.get(f"{title}".strip().lower(), None)
+
+    def resolve(self, name):
+        """
+        title for a title in any case or an abbreviation, None if neither is known
+        """
+        key = f"{name}".strip().lower()
+        return self.titles.get(key, None) or self.abbreviations.get(key, None)
+
+    def _sorted_keys(self) -> list:
+        with self._lock:
+            if self._dirty:
+                self._sorted = sorted(self.titles)
+                self._dirty = False
+            return self._sorted
+
+    def complete(self, text, limit=MAX_CHOICES) -> list:
+        keys = self._sorted_keys()
+        query = f"{text}".strip().lower()
+        if query == "":
+            return [self.titles[key] for key in keys[:limit]]
+        matches = {}
+
+        def add(title):
+            if title is not None and len(matches) < limit:
+                matches.setdefault(title, None)
+
+        index = bisect_left(keys, query)
+        while index < len(keys) and keys[index].startswith(query) and len(matches) < limit:
+            add(self.titles[keys[index]])
+            index += 1
+        for abbreviation, title in self.abbreviations.items():
+            if abbreviation.startswith(query):
+                add(title)
+        for key in keys:
+            if len(matches) >= limit:
+                break
+            # substrings of one or two characters match almost every title
+            if any(word.startswith(query) for word in key.split()) or (len(query) > 2 and query in key):
+                add(self.titles[key])
+        if len(matches) < limit:
+            for key in difflib.get_close_matches(query, keys, n=limit, cutoff=0.5):
+                add(self.titles[key])
+        return list(matches)